@@ -1,8 +1,11 @@
 import time
 import json
 import os
+import hashlib
 from elasticsearch import Elasticsearch
 from datetime import datetime
+from anomaly_report import METADATA, iter_report
+from es_bulk import DiffPublisher
 
 # === CONFIGURATION (UPDATED for Elastic Cloud) ===
 # 1. Cloud Endpoint URL (No change needed here, just the variable name)
@@ -11,7 +14,8 @@ ELASTIC_API_KEY = "RjRmblpwb0I0aUN3aFd6cjEyZ1E6d2hRRVBHX0V5MnI3NW1sZXZ0eEpqUQ=="
 # 3. Index name
 ELASTIC_INDEX_ANOMALIES = "anomalies_data_index"
 
-JSON_FILE = "anomalies.json"
+# Streaming report written by find_matches.py (a nested anomalies.json works too)
+REPORT_FILE = "anomalies.ndjson"
 PUSH_INTERVAL_SECONDS = 30
 
 # === ELASTICSEARCH SETUP (FIXED to use hosts) ===
@@ -60,75 +64,84 @@ def create_index(index_name):
         print(f"Index already exists: {index_name}")
 
 
-def flatten_anomalies_and_matches(data):
+def document_id(doc):
     """
-    Flattens the nested JSON data (anomalies and matches) into a single list
-    of documents ready for Elasticsearch indexing.
+    Stable id for a flattened document: (date, cauldron_id, type, key) where
+    key is the ticket id for ticket anomalies, the drain time for drain
+    anomalies and the drain end time for matches. Re-pushing the same report
+    therefore overwrites instead of duplicating.
     """
-    all_documents = []
-
-    # --- 1. Flatten ANOMALIES ---
-    for date_str, cauldrons in data.get("anomalies", {}).items():
-        for cid, events in cauldrons.items():
-            for event in events:
-                # Add metadata for searchability
-                event['cauldron_id'] = cid
-                event['date'] = date_str
-                event['data_source'] = "ANOMALY"
-                all_documents.append(event)
-
-    # --- 2. Flatten MATCHES ---
-    for date_str, cauldrons in data.get("matches", {}).items():
-        for cid, matches in cauldrons.items():
-            for match in matches:
-                # Add metadata for searchability
-                match['cauldron_id'] = cid
-                match['date'] = date_str
-                match['data_source'] = "MATCH"
-                all_documents.append(match)
-
-    return all_documents
-
-
-# Main loop: load, flatten, and push
+    key = doc.get("ticket_id") or doc.get("time") or doc.get("drain_end_time")
+    return f"{doc['date']}|{doc['cauldron_id']}|{doc['type']}|{key}"
+
+
+def file_signature(path):
+    """(inode, mtime, size): changes whenever the report is rewritten or replaced."""
+    st = os.stat(path)
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+def file_digest(path, chunk_size=1 << 20):
+    """sha256 of the file, read in chunks."""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+# Main loop: push only what changed in the report
 def push_anomalies_data():
+    # Last published doc per id; unchanged docs are never re-sent, vanished ones are deleted
+    publisher = DiffPublisher()
+    last_signature = None   # file_signature() of the last fully pushed file
+    last_digest = None      # sha256 of its content
     while True:
         try:
             # Check if the file exists
-            if not os.path.exists(JSON_FILE):
-                print(f"WARNING: JSON file not found at {JSON_FILE}. Skipping push.")
+            if not os.path.exists(REPORT_FILE):
+                print(f"WARNING: Report file not found at {REPORT_FILE}. Skipping push.")
                 time.sleep(PUSH_INTERVAL_SECONDS)
                 continue
 
-            print(f"\n--- Starting push at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} ---")
-
-            # 1. Load data from the anomalies.json file
-            with open(JSON_FILE, 'r') as f:
-                json_data = json.load(f)
+            # 1. Cheap check first: file untouched since the last push -> nothing to do
+            signature = file_signature(REPORT_FILE)
+            if signature == last_signature:
+                time.sleep(PUSH_INTERVAL_SECONDS)
+                continue
 
-            # 2. Flatten the nested structure
-            documents_to_push = flatten_anomalies_and_matches(json_data)
+            print(f"\n--- Starting push at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} ---")
 
-            if not documents_to_push:
-                print("JSON file is empty or contains no data. Nothing to push.")
+            # 2. Rewritten with identical content (e.g. find_matches re-run) -> nothing to do
+            digest = file_digest(REPORT_FILE)
+            if digest == last_digest:
+                print("Report content unchanged. Nothing to push.")
+                last_signature = signature
                 time.sleep(PUSH_INTERVAL_SECONDS)
                 continue
 
-            # 3. Push data to Elasticsearch
-            pushed_count = 0
-            for doc in documents_to_push:
-                # Index document (ES generates the ID)
-                es.index(index=ELASTIC_INDEX_ANOMALIES, document=doc)
-                pushed_count += 1
-
-            print(f"Successfully pushed {pushed_count} documents to {ELASTIC_INDEX_ANOMALIES}.")
+            # 3. Read the report record by record, keyed by stable document ids
+            documents = (
+                (document_id(doc), doc)
+                for doc in iter_report(REPORT_FILE)
+                if doc["data_source"] != METADATA
+            )
+
+            # 4. New/changed docs go out in bounded bulk chunks as they are read, deletions last
+            report = publisher.publish_stream(es, ELASTIC_INDEX_ANOMALIES, documents, prune=True)
+            print(f"Pushed to {ELASTIC_INDEX_ANOMALIES}: {report.summary()}")
+            for error in report.errors:
+                print(f"  Failed: {error}")
+            if report.failed == 0:
+                last_signature, last_digest = signature, digest
 
         except json.JSONDecodeError:
-            print(f"Error: Could not decode JSON from {JSON_FILE}. Check file integrity.")
+            # The signature is not recorded, so the file is retried next interval
+            print(f"Error: Could not decode JSON from {REPORT_FILE}. Check file integrity.")
         except Exception as e:
             print(f"An unexpected error occurred during the push: {e}")
 
-        # 4. Wait for the defined interval
+        # 5. Wait for the defined interval
         time.sleep(PUSH_INTERVAL_SECONDS)
 
 if __name__ == "__main__":
@@ -0,0 +1,171 @@
+"""
+Streaming form of the reconciliation report.
+
+find_matches writes one flat JSON document per line (NDJSON) as each
+cauldron finishes, in the same shape anamolies_data_pusher indexes:
+
+    {"volume": 44.1, "time": "2025-10-30 19:10:00", "type": "DRAIN_ANOMALY",
+     "cauldron_id": "cauldron_005", "date": "2025-10-30", "data_source": "ANOMALY"}
+    {"type": "1-to-1", "drain_volume": ..., "cauldron_id": ..., "date": ..., "data_source": "MATCH"}
+    ...
+    {"data_source": "METADATA", "start_date": ..., "end_date": ..., "dates": [...], ...}
+
+Records are ordered by cauldron, then date, and the metadata record comes
+last. The file is written to a temporary name and renamed on close, so
+readers never see a half-written report.
+
+iter_report() reads either this form or the nested anomalies.json one record
+at a time. export_nested() rebuilds the date-major {"anomalies", "matches",
+"metadata"} file the dashboard loads from an index of byte offsets per date,
+reading the records back one at a time instead of holding the whole report
+in memory.
+"""
+import itertools
+import json
+import os
+
+ANOMALY = "ANOMALY"
+MATCH = "MATCH"
+METADATA = "METADATA"
+
+# Keys added to anomaly records when flattening (matches already carry cauldron_id/date)
+_ANOMALY_KEYS = ("cauldron_id", "date", "data_source")
+
+
+class ReportWriter:
+    def __init__(self, path):
+        self.path = str(path)
+        self._tmp = self.path + ".tmp"
+        self._f = open(self._tmp, "w")
+        self.dates = []
+        self.records = 0
+
+    def _write(self, record):
+        self._f.write(json.dumps(record))
+        self._f.write("\n")
+        self.records += 1
+
+    def start_date(self, date_str):
+        """Mark a date as analyzed (kept in metadata so empty dates survive the export, in this order)."""
+        self.dates.append(date_str)
+
+    def write_day(self, date_str, cauldron_id, anomalies, matches):
+        """Append one cauldron/date result (cauldron-major); flushed so progress is visible on disk."""
+        for event in anomalies:
+            self._write({**event, "cauldron_id": cauldron_id, "date": date_str, "data_source": ANOMALY})
+        for match in matches:
+            self._write({**match, "cauldron_id": cauldron_id, "date": date_str, "data_source": MATCH})
+        self._f.flush()
+
+    def close(self, metadata=None):
+        """Write the metadata record and move the file into place."""
+        self._write({"data_source": METADATA, **(metadata or {}), "dates": self.dates})
+        self._f.close()
+        os.replace(self._tmp, self.path)
+
+    def abort(self):
+        self._f.close()
+        os.remove(self._tmp)
+
+
+def flatten_nested(data):
+    """Flat records (anomalies, then matches) from a nested report dict."""
+    for section, source in (("anomalies", ANOMALY), ("matches", MATCH)):
+        for date_str, cauldrons in data.get(section, {}).items():
+            for cid, events in cauldrons.items():
+                for event in events:
+                    yield {**event, "cauldron_id": cid, "date": date_str, "data_source": source}
+    if "metadata" in data:
+        yield {"data_source": METADATA, **data["metadata"]}
+
+
+def iter_report(path):
+    """
+    Yield report records one at a time. NDJSON is read line by line; a
+    nested .json report is loaded once and flattened on the fly.
+    """
+    if str(path).endswith(".json"):
+        with open(path) as f:
+            yield from flatten_nested(json.load(f))
+        return
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _nested_entry(record):
+    entry = dict(record)
+    keys = _ANOMALY_KEYS if record["data_source"] == ANOMALY else ("data_source",)
+    for key in keys:
+        entry.pop(key, None)
+    return entry
+
+
+def _index_report(ndjson_path):
+    """
+    One pass over an NDJSON report: {source: {date: [byte offset, ...]}} for
+    the anomaly and match records (file order within a date) and the
+    metadata record.
+    """
+    offsets = {ANOMALY: {}, MATCH: {}}
+    metadata = None
+    with open(ndjson_path, "rb") as f:
+        pos = 0
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                if record["data_source"] == METADATA:
+                    metadata = record
+                else:
+                    offsets[record["data_source"]].setdefault(record["date"], []).append(pos)
+            pos += len(line)
+    return offsets, metadata
+
+
+def _read_at(f, offsets):
+    for offset in offsets:
+        f.seek(offset)
+        yield json.loads(f.readline())
+
+
+def _write_section(f, name, report, offsets_by_date, dates, indent):
+    """Write '"name": {date: {cauldron: [...]}}', reading each date's records by offset."""
+    pad = " " * indent
+    f.write(f'{pad}"{name}": {{')
+    # Dates without records stay as {}
+    first_date = True
+    for date_str in dates:
+        f.write(("" if first_date else ",") + f'\n{pad * 2}"{date_str}": {{')
+        first_date = False
+        first_cauldron = True
+        records = _read_at(report, offsets_by_date.get(date_str, ()))
+        for cid, events in itertools.groupby(records, key=lambda r: r["cauldron_id"]):
+            body = json.dumps([_nested_entry(e) for e in events], indent=indent)
+            body = body.replace("\n", "\n" + pad * 3)
+            f.write(("" if first_cauldron else ",") + f'\n{pad * 3}"{cid}": {body}')
+            first_cauldron = False
+        f.write(f"\n{pad * 2}}}" if not first_cauldron else "}")
+    f.write(f"\n{pad}}}" if dates else "}")
+
+
+def export_nested(ndjson_path, json_path, indent=4):
+    """
+    Rebuild the nested dashboard report from an NDJSON report, one date
+    (and one cauldron list) at a time.
+    """
+    offsets, record = _index_report(ndjson_path)
+    if record is None:
+        raise ValueError(f"{ndjson_path} has no metadata record (incomplete report?)")
+    metadata = {k: v for k, v in record.items() if k not in ("data_source", "dates")}
+    dates = record.get("dates", [])
+
+    tmp = str(json_path) + ".tmp"
+    with open(tmp, "w") as f, open(ndjson_path, "rb") as report:
+        f.write("{\n")
+        for name, source in (("anomalies", ANOMALY), ("matches", MATCH)):
+            _write_section(f, name, report, offsets[source], dates, indent)
+            f.write(",\n")
+        meta = json.dumps(metadata, indent=indent).replace("\n", "\n" + " " * indent)
+        f.write(f'{" " * indent}"metadata": {meta}\n}}')
+    os.replace(tmp, json_path)
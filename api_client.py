@@ -0,0 +1,360 @@
+"""
+Shared HTTP client for the EOG API, used by every ingester and script.
+
+ApiClient keeps one pooled keep-alive requests.Session, applies a timeout to
+every call and retries connection errors, timeouts and 429/5xx responses a
+bounded number of times with exponential backoff (plus jitter; a numeric
+Retry-After header is honoured). Latency, failures and retries are recorded
+per endpoint path in `client.metrics`.
+
+AsyncApiClient is the asyncio front-end: it shares the same session pool and
+retry policy, and runs independent requests concurrently, e.g.
+
+    api = AsyncApiClient(base_url=API_BASE)
+    topology = asyncio.run(api.gather(cauldrons="/api/Information/cauldrons",
+                                      network="/api/Information/network"))
+
+TopologyCache keeps the rarely-changing /api/Information payloads between
+calls: within its TTL no request is made, after it a conditional request
+(If-None-Match / If-Modified-Since) is sent, and every payload is hashed so
+callers can skip re-indexing when nothing changed:
+
+    entry = api.get_cached(NETWORK_PATH, topology_cache)
+    if entry.changed:
+        reindex(entry.value)
+
+See api_stub.py for a local stand-in server.
+"""
+import asyncio
+import functools
+import hashlib
+import json
+import random
+import threading
+import time
+from collections import deque
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from data_loader import BASE_URL
+
+DEFAULT_TIMEOUT = (3.05, 30)       # (connect, read) seconds
+MAX_RETRIES = 3                    # retries after the first attempt
+BACKOFF_BASE = 0.5                 # seconds; doubled on every retry
+BACKOFF_MAX = 8.0                  # cap for a single backoff sleep
+POOL_SIZE = 10                     # keep-alive connections per host
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+TOPOLOGY_TTL = 15 * 60             # seconds a cached topology payload is used without asking
+
+# Paths of the API endpoints the scripts use
+DATA_PATH = "/api/Data"
+TICKETS_PATH = "/api/Tickets"
+CAULDRONS_PATH = "/api/Information/cauldrons"
+MARKET_PATH = "/api/Information/market"
+COURIERS_PATH = "/api/Information/couriers"
+NETWORK_PATH = "/api/Information/network"
+
+
+class EndpointStats:
+    def __init__(self, window=1000):
+        self.calls = 0
+        self.failures = 0        # calls that still failed after all retries
+        self.retries = 0
+        self.latencies = deque(maxlen=window)  # seconds per call, retries included
+
+    def summary(self):
+        latencies = sorted(self.latencies)
+        p50 = latencies[len(latencies) // 2] * 1000 if latencies else 0.0
+        worst = latencies[-1] * 1000 if latencies else 0.0
+        return (f"{self.calls} call(s), {self.failures} failed, {self.retries} retried, "
+                f"p50 {p50:.0f} ms, max {worst:.0f} ms")
+
+
+class ApiMetrics:
+    """Per-endpoint latency and error counters (thread-safe)."""
+
+    def __init__(self):
+        self.endpoints = {}
+        self._lock = threading.Lock()
+
+    def record(self, path, seconds, ok, retries):
+        with self._lock:
+            stats = self.endpoints.setdefault(path, EndpointStats())
+            stats.calls += 1
+            stats.failures += 0 if ok else 1
+            stats.retries += retries
+            stats.latencies.append(seconds)
+
+    def summary(self):
+        with self._lock:
+            return [f"{path}: {stats.summary()}" for path, stats in sorted(self.endpoints.items())]
+
+    def reset(self):
+        with self._lock:
+            self.endpoints.clear()
+
+
+def _retry_after(response):
+    value = response.headers.get("Retry-After") if response is not None else None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class CachedResponse:
+    def __init__(self, value, digest, etag=None, last_modified=None, fetched_at=0.0):
+        self.value = value
+        self.digest = digest                # sha256 of the canonical JSON payload
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched_at = fetched_at
+        self.changed = True                 # payload differs from the previous one
+
+
+class TopologyCache:
+    """
+    TTL + conditional-request cache for JSON endpoints, keyed by path.
+    Used through ApiClient.get_cached / AsyncApiClient.get_cached.
+    """
+
+    def __init__(self, ttl=TOPOLOGY_TTL, clock=time.monotonic):
+        self.ttl = ttl
+        self.clock = clock
+        self.entries = {}
+        self.requests = 0                   # conditional or full requests sent
+        self.not_modified = 0               # 304 answers
+        self.unchanged = 0                  # 200 answers with an identical payload
+
+    def fresh(self, path):
+        """Entry still inside its TTL (marked unchanged), or None."""
+        entry = self.entries.get(path)
+        if entry is None or self.clock() - entry.fetched_at >= self.ttl:
+            return None
+        entry.changed = False
+        return entry
+
+    def conditional_headers(self, path):
+        entry = self.entries.get(path)
+        headers = {}
+        if entry is not None:
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+        return headers
+
+    def store(self, path, response):
+        """Record the answer to a conditional request and return the entry."""
+        self.requests += 1
+        entry = self.entries.get(path)
+        if response.status_code == 304 and entry is not None:
+            self.not_modified += 1
+            entry.fetched_at = self.clock()
+            entry.changed = False
+            return entry
+
+        response.raise_for_status()
+        value = response.json()
+        digest = hashlib.sha256(json.dumps(value, sort_keys=True).encode()).hexdigest()
+        new = CachedResponse(value, digest, response.headers.get("ETag"),
+                             response.headers.get("Last-Modified"), self.clock())
+        new.changed = entry is None or entry.digest != digest
+        self.unchanged += 0 if new.changed else 1
+        self.entries[path] = new
+        return new
+
+    def invalidate(self, path=None):
+        """Forget one path (or everything) so the next call refetches and reports it changed."""
+        if path is None:
+            self.entries.clear()
+        else:
+            self.entries.pop(path, None)
+
+    def summary(self):
+        return (f"{len(self.entries)} cached, {self.requests} request(s), "
+                f"{self.not_modified} not modified, {self.unchanged} identical")
+
+
+class ApiClient:
+    def __init__(self, base_url=BASE_URL, timeout=DEFAULT_TIMEOUT, retries=MAX_RETRIES,
+                 backoff=BACKOFF_BASE, pool_size=POOL_SIZE):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.metrics = ApiMetrics()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ---------- retry policy (shared with AsyncApiClient) ----------
+    def _send_once(self, path, params=None, headers=None):
+        return self.session.get(f"{self.base_url}{path}", params=params, headers=headers,
+                                timeout=self.timeout)
+
+    def _retry_delay(self, attempt, response=None, error=None):
+        """
+        Seconds to wait before retrying after `attempt` (0-based), or None if
+        the outcome is final: a response outside RETRY_STATUSES, a
+        non-transient error, or no retries left.
+        """
+        if error is not None:
+            if not isinstance(error, (requests.ConnectionError, requests.Timeout)):
+                return None
+        elif response.status_code not in RETRY_STATUSES:
+            return None
+        if attempt >= self.retries:
+            return None
+        delay = min(BACKOFF_MAX, self.backoff * (2 ** attempt)) * random.uniform(0.5, 1.0)
+        hinted = _retry_after(response)
+        return min(BACKOFF_MAX, hinted) if hinted is not None else delay
+
+    # ---------- requests ----------
+    def get(self, path, params=None, headers=None):
+        """GET `path` with retries; returns the final Response (status not checked)."""
+        t0 = time.perf_counter()
+        attempt = 0
+        while True:
+            response = error = None
+            try:
+                response = self._send_once(path, params, headers)
+            except requests.RequestException as e:
+                error = e
+            delay = self._retry_delay(attempt, response, error)
+            if delay is None:
+                break
+            time.sleep(delay)
+            attempt += 1
+
+        ok = error is None and response.status_code < 400
+        self.metrics.record(path, time.perf_counter() - t0, ok, attempt)
+        if error is not None:
+            raise error
+        return response
+
+    def get_json(self, path, params=None):
+        response = self.get(path, params)
+        response.raise_for_status()
+        return response.json()
+
+    def get_cached(self, path, cache):
+        """CachedResponse for `path` through a TopologyCache (see module docstring)."""
+        entry = cache.fresh(path)
+        if entry is not None:
+            return entry
+        return cache.store(path, self.get(path, headers=cache.conditional_headers(path)))
+
+    # ---------- endpoints ----------
+    def data(self, start_date, end_date):
+        return self.get_json(DATA_PATH, {"start_date": start_date, "end_date": end_date})
+
+    def tickets(self):
+        return self.get_json(TICKETS_PATH)
+
+    def cauldrons(self):
+        return self.get_json(CAULDRONS_PATH)
+
+    def market(self):
+        return self.get_json(MARKET_PATH)
+
+    def couriers(self):
+        return self.get_json(COURIERS_PATH)
+
+    def network(self):
+        return self.get_json(NETWORK_PATH)
+
+
+class AsyncApiClient:
+    """
+    asyncio variant of ApiClient. Each attempt runs the pooled session call on
+    a worker thread, and backoff sleeps are asyncio.sleep, so independent
+    requests (and their retries) overlap instead of queueing.
+    """
+
+    def __init__(self, client=None, **client_kwargs):
+        self.client = client or ApiClient(**client_kwargs)
+
+    @property
+    def metrics(self):
+        return self.client.metrics
+
+    def close(self):
+        self.client.close()
+
+    async def get(self, path, params=None, headers=None):
+        client = self.client
+        loop = asyncio.get_running_loop()
+        t0 = time.perf_counter()
+        attempt = 0
+        while True:
+            response = error = None
+            try:
+                response = await loop.run_in_executor(
+                    None, functools.partial(client._send_once, path, params, headers))
+            except requests.RequestException as e:
+                error = e
+            delay = client._retry_delay(attempt, response, error)
+            if delay is None:
+                break
+            await asyncio.sleep(delay)
+            attempt += 1
+
+        ok = error is None and response.status_code < 400
+        client.metrics.record(path, time.perf_counter() - t0, ok, attempt)
+        if error is not None:
+            raise error
+        return response
+
+    async def get_json(self, path, params=None):
+        response = await self.get(path, params)
+        response.raise_for_status()
+        return response.json()
+
+    async def get_cached(self, path, cache):
+        entry = cache.fresh(path)
+        if entry is not None:
+            return entry
+        return cache.store(path, await self.get(path, headers=cache.conditional_headers(path)))
+
+    async def gather(self, **paths):
+        """
+        Fetch several endpoints concurrently: gather(name=path, ...) returns
+        {name: json}. Raises the first error after all requests finish.
+        """
+        names = list(paths)
+        results = await asyncio.gather(*(self.get_json(paths[n]) for n in names),
+                                       return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+        return dict(zip(names, results))
+
+    async def topology(self):
+        """cauldrons, market, couriers and network in one concurrent round trip."""
+        return await self.gather(cauldrons=CAULDRONS_PATH, market=MARKET_PATH,
+                                 couriers=COURIERS_PATH, network=NETWORK_PATH)
+
+    async def cached_topology(self, cache):
+        """
+        Like topology(), through a TopologyCache: returns {name: CachedResponse}.
+        Entries inside the TTL cost no request at all.
+        """
+        paths = {"cauldrons": CAULDRONS_PATH, "market": MARKET_PATH,
+                 "couriers": COURIERS_PATH, "network": NETWORK_PATH}
+        entries = await asyncio.gather(*(self.get_cached(p, cache) for p in paths.values()))
+        return dict(zip(paths, entries))
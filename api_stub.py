@@ -0,0 +1,190 @@
+"""
+Local stand-in for the EOG API, for running the ingesters and ApiClient
+offline.
+
+    with StubApiServer() as server:
+        api = ApiClient(server.url)
+        server.fail(MARKET_PATH, times=2, status=503)   # next 2 calls fail
+        server.delay(DATA_PATH, 0.2)                     # add 200 ms latency
+        api.market()
+        server.requests                                  # [(path, query), ...]
+
+The canned payloads follow the swagger.json shapes. /api/Data honours
+start_date/end_date; the other endpoints send an ETag and answer
+If-None-Match with 304 (set `etags=False` to mimic a server without them). Run `python api_stub.py --port 8099` to serve it
+standalone, then point a script's base URL at http://127.0.0.1:8099.
+"""
+import argparse
+import calendar
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from api_client import (CAULDRONS_PATH, COURIERS_PATH, DATA_PATH, MARKET_PATH,
+                        NETWORK_PATH, TICKETS_PATH)
+
+SAMPLE_START = 1761782400          # 2025-10-30T00:00:00Z
+DRAIN_VOLUME = 100.0               # litres drained (and ticketed) per cauldron
+
+
+def sample_payloads(n_cauldrons=3, minutes=120, start=SAMPLE_START):
+    """Small, deterministic payloads for every endpoint, keyed by path."""
+    ids = [f"cauldron_{i + 1:03d}" for i in range(n_cauldrons)]
+    data = []
+    for m in range(minutes):
+        stamp = time.strftime("%Y-%m-%dT%H:%M:%S+00:00", time.gmtime(start + 60 * m))
+        # Slow fill (0.5 L/min) with one 100 L drain over 5 minutes per cauldron halfway through
+        drained = min(DRAIN_VOLUME, 20 * max(0, m - minutes // 2))
+        data.append({
+            "timestamp": stamp,
+            "cauldron_levels": {cid: round(200 + 10 * i + 0.5 * m - drained, 2)
+                                for i, cid in enumerate(ids)},
+        })
+    day = time.strftime("%Y-%m-%d", time.gmtime(start))
+    return {
+        DATA_PATH: data,
+        CAULDRONS_PATH: [
+            {"id": cid, "name": f"Cauldron {i + 1}", "latitude": 33.0 + 0.01 * i,
+             "longitude": -96.0 - 0.01 * i, "max_volume": 1000}
+            for i, cid in enumerate(ids)
+        ],
+        MARKET_PATH: {"id": "market_001", "name": "Market", "latitude": 33.05,
+                      "longitude": -96.05, "description": "Stub market"},
+        COURIERS_PATH: [{"courier_id": "courier_witch_01", "name": "Witch 1", "max_carrying_capacity": 100}],
+        NETWORK_PATH: {
+            "edges": [{"from": "market_001", "to": cid, "travel_time_minutes": 10 + i}
+                      for i, cid in enumerate(ids)],
+            "description": "Stub network",
+        },
+        TICKETS_PATH: {
+            "metadata": {"total_tickets": len(ids), "suspicious_tickets": 0,
+                         "date_range": {"start": f"{day}T00:00:00", "end": f"{day}T00:00:00"}},
+            "transport_tickets": [
+                {"ticket_id": f"TT_{i + 1:03d}", "cauldron_id": cid, "amount_collected": DRAIN_VOLUME,
+                 "courier_id": "courier_witch_01", "date": day}
+                for i, cid in enumerate(ids)
+            ],
+        },
+    }
+
+
+def _epoch(stamp):
+    return calendar.timegm(time.strptime(stamp[:19], "%Y-%m-%dT%H:%M:%S"))
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server.stub
+        url = urlsplit(self.path)
+        path, query = url.path.rstrip("/"), parse_qs(url.query)
+        status, delay = server._next_behaviour(path, url.query)
+        if delay:
+            time.sleep(delay)
+
+        if status is None:
+            payload = server.payloads.get(path)
+            status = 404 if payload is None else 200
+        if status != 200:
+            return self._send(status, {"error": f"stub status {status}"})
+
+        if path == DATA_PATH:
+            start = int(query.get("start_date", [0])[0])
+            end = int(query.get("end_date", [2 ** 62])[0])
+            payload = [row for row in payload if start <= _epoch(row["timestamp"]) <= end]
+            return self._send(200, payload)
+
+        body = json.dumps(payload).encode()
+        etag = f'"{hashlib.sha1(body).hexdigest()}"' if server.etags else None
+        if etag and self.headers.get("If-None-Match") == etag:
+            return self._send(304, None, etag)
+        self._send(200, payload, etag)
+
+    def _send(self, status, payload, etag=None):
+        body = b"" if payload is None else json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if etag:
+            self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubApiServer:
+    def __init__(self, payloads=None, host="127.0.0.1", port=0, etags=True):
+        self.payloads = payloads if payloads is not None else sample_payloads()
+        self.etags = etags
+        self.requests = []
+        self._failures = {}      # path -> [remaining, status]
+        self._delays = {}        # path -> seconds
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.stub = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def fail(self, path, times=1, status=503):
+        """Answer the next `times` requests to `path` with `status`."""
+        with self._lock:
+            self._failures[path] = [times, status]
+
+    def delay(self, path, seconds):
+        """Sleep `seconds` before answering every request to `path`."""
+        with self._lock:
+            self._delays[path] = seconds
+
+    def _next_behaviour(self, path, query):
+        with self._lock:
+            self.requests.append((path, query))
+            status = None
+            failure = self._failures.get(path)
+            if failure and failure[0] > 0:
+                failure[0] -= 1
+                status = failure[1]
+            return status, self._delays.get(path, 0)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve canned EOG API payloads locally.")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--cauldrons", type=int, default=12)
+    parser.add_argument("--minutes", type=int, default=24 * 60)
+    args = parser.parse_args()
+
+    server = StubApiServer(sample_payloads(args.cauldrons, args.minutes), port=args.port)
+    print(f"Stub API on {server.url} (Ctrl+C to stop)")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
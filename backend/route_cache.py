@@ -0,0 +1,141 @@
+"""
+Route-plan cache for the witch routes API.
+
+Training the Q-agents for a plan takes seconds to minutes, so plans are
+computed off the request path and kept per input key: a hash of
+slopes.json, the cauldron topology and the search parameters. Each plan is
+stored already serialized, so a GET is a dict lookup plus a memcpy.
+
+    cache = RoutePlanCache(compute_plan)          # compute_plan(params) -> dict
+    cache.refresh(key, params)                    # start a background compute
+    entry, stale = cache.get(key, params)         # newest plan (maybe for older inputs)
+
+When the inputs change the key changes. With stale_while_revalidate the
+last plan is still served (flagged stale) while the new one is computed;
+without it callers wait for the fresh plan.
+
+A failed compute is remembered per key: until its backoff (error_backoff
+seconds, doubled on every consecutive failure up to ERROR_BACKOFF_MAX)
+runs out, refresh() and get() raise the stored error instead of starting
+another full training run. force=True retries at once.
+"""
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+ERROR_BACKOFF = 30.0               # seconds a failed key is not recomputed (first failure)
+ERROR_BACKOFF_MAX = 15 * 60.0
+
+
+def digest(value):
+    """sha256 of the canonical JSON form of `value`."""
+    return hashlib.sha256(json.dumps(value, sort_keys=True).encode()).hexdigest()
+
+
+class PlanError(RuntimeError):
+    """The last compute for a key failed and its backoff has not expired."""
+
+
+class PlanEntry:
+    def __init__(self, key, plan, seconds):
+        self.key = key
+        self.plan = plan
+        self.body = json.dumps(plan).encode()
+        self.etag = f'"{key[:16]}-{int(time.time() * 1000)}"'
+        self.computed_at = time.time()
+        self.seconds = seconds                  # time the compute took
+
+
+class RoutePlanCache:
+    def __init__(self, compute, stale_while_revalidate=True, workers=1, error_backoff=ERROR_BACKOFF):
+        self.compute = compute
+        self.stale_while_revalidate = stale_while_revalidate
+        self.error_backoff = error_backoff
+        self.entries = {}                       # key -> PlanEntry
+        self.latest = None                      # most recently computed PlanEntry
+        self.errors = {}                        # key -> str of the last failed compute
+        self.failures = {}                      # key -> (consecutive failures, retry after time.time())
+        self._pending = {}                      # key -> Future
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="route-plan")
+
+    def _run(self, key, params):
+        t0 = time.perf_counter()
+        try:
+            plan = self.compute(params)
+        except Exception as e:
+            with self._lock:
+                count = self.failures.get(key, (0, 0.0))[0] + 1
+                backoff = min(ERROR_BACKOFF_MAX, self.error_backoff * 2 ** (count - 1))
+                self.failures[key] = (count, time.time() + backoff)
+                self.errors[key] = str(e) or type(e).__name__
+                self._pending.pop(key, None)
+            raise
+        entry = PlanEntry(key, plan, time.perf_counter() - t0)
+        with self._lock:
+            self.entries[key] = entry
+            self.latest = entry
+            self.errors.pop(key, None)
+            self.failures.pop(key, None)
+            self._pending.pop(key, None)
+        return entry
+
+    def refresh(self, key, params, force=False):
+        """
+        Future of the plan for `key`: the in-flight compute if there is one,
+        an already finished one if the plan is cached (unless force), one
+        failed with PlanError while the key's failure backoff lasts (unless
+        force), or a newly started background compute.
+        """
+        with self._lock:
+            future = self._pending.get(key)
+            if future is not None:
+                return future
+            if not force and key in self.entries:
+                future = Future()
+                future.set_result(self.entries[key])
+                return future
+            if not force and self.retry_at(key) is not None:
+                future = Future()
+                future.set_exception(PlanError(self.errors[key]))
+                return future
+            future = self._pool.submit(self._run, key, params)
+            self._pending[key] = future
+            return future
+
+    def get(self, key, params, timeout=None):
+        """
+        (entry, stale) for `key`. A cached plan is returned at once. Otherwise
+        a compute is started; with stale_while_revalidate the previous plan is
+        returned meanwhile (stale=True), else (or if there is none yet) this
+        waits for the compute and re-raises its error.
+        """
+        entry = self.entries.get(key)
+        if entry is not None:
+            return entry, False
+        future = self.refresh(key, params)
+        if self.stale_while_revalidate and self.latest is not None:
+            return self.latest, True
+        return future.result(timeout), False
+
+    def retry_at(self, key):
+        """time.time() after which a failed `key` is computed again, or None if it is not backing off."""
+        failure = self.failures.get(key)
+        if failure is None or time.time() >= failure[1]:
+            return None
+        return failure[1]
+
+    def computing(self):
+        with self._lock:
+            return list(self._pending)
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            self.latest = None
+            self.failures.clear()
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False)
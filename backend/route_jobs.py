@@ -0,0 +1,185 @@
+"""
+Route optimization jobs on a process pool.
+
+Training Q-agents is pure-Python CPU work: run on the API process it holds
+the GIL and stalls every other request. JobManager runs each job in a
+worker process instead and keeps a small status record per job that the
+API can poll.
+
+    jobs = JobManager(compute_plan)              # compute_plan(params, progress) -> dict
+    job = jobs.submit({"episodes": 400})
+    jobs.status(job.id)                          # {"status", "progress", "best", ...}
+    plan = job.future.result()
+
+The target runs in the worker and gets a `progress` callable; every event
+it reports is sent back over a queue and folded into the job record by a
+listener thread:
+
+    {"event": "candidate", "n": 4, "episodes_total": 1600}   # started a witch count
+    {"event": "episodes", "done": 20}                        # more episodes trained
+    {"event": "result", "n": 4, "feasible": False, "delivered": ..., ...}
+    {"event": "cancelled", "n": 5, "episodes_total": 2000}   # abandoned by a parallel search
+"""
+import itertools
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+ROUTE_JOB_WORKERS = max(1, min(4, (os.cpu_count() or 2) - 1))
+MAX_FINISHED_JOBS = 100            # finished job records kept for polling
+
+_progress_queue = None             # set in worker processes by _init_worker
+
+
+def _init_worker(queue):
+    global _progress_queue
+    _progress_queue = queue
+
+
+def _run_job(target, job_id, params):
+    def progress(event):
+        _progress_queue.put((job_id, event))
+    progress({"event": "started"})
+    return target(params, progress)
+
+
+def _rank(result):
+    """Sort key for candidate results: feasible first, then fewest problems, then most delivered."""
+    return (result.get("feasible", False), -result.get("overflowing", 0),
+            -result.get("unvisited", 0), result.get("delivered", 0.0))
+
+
+class RouteJob:
+    def __init__(self, job_id, params):
+        self.id = job_id
+        self.params = params
+        self.status = "queued"                 # queued, running, done, failed
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.n = None                          # largest witch count being trained
+        self.episodes_done = 0
+        self.episodes_total = 0
+        self.candidates = []                   # result events, in arrival order
+        self.best = None
+        self.error = None
+        self.result = None
+        self.future = None
+
+    def apply(self, event):
+        kind = event.get("event")
+        if kind == "started":
+            if self.status == "queued":         # events can trail the finished future
+                self.status = "running"
+                self.started_at = time.time()
+        elif kind == "candidate":
+            self.n = event["n"]
+            self.episodes_total += event.get("episodes_total", 0)
+        elif kind == "cancelled":
+            self.episodes_total -= event.get("episodes_total", 0)
+            if self.n is not None and self.n >= event["n"]:
+                self.n = event["n"] - 1
+        elif kind == "episodes":
+            self.episodes_done += event["done"]
+        elif kind == "result":
+            result = {k: v for k, v in event.items() if k != "event"}
+            self.candidates.append(result)
+            if self.best is None or _rank(result) > _rank(self.best):
+                self.best = result
+
+    def to_dict(self, include_result=True):
+        doc = {
+            "job_id": self.id,
+            "status": self.status,
+            "params": self.params,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "progress": {
+                "n": self.n,
+                "episodes_done": self.episodes_done,
+                "episodes_total": self.episodes_total,
+                "candidates_tried": len(self.candidates),
+            },
+            "best": self.best,
+            "error": self.error,
+        }
+        if include_result and self.status == "done":
+            doc["result"] = self.result
+        return doc
+
+
+class JobManager:
+    def __init__(self, target, workers=ROUTE_JOB_WORKERS):
+        """target: top-level (picklable) function(params, progress) -> plan dict."""
+        self.target = target
+        self.workers = workers
+        self.jobs = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._pool = None
+        self._queue = None
+        self._listener = None
+
+    def _start(self):
+        # spawn: the API process runs threads (server, listener), which fork does not copy safely
+        ctx = multiprocessing.get_context("spawn")
+        self._queue = ctx.Queue()
+        self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=ctx,
+                                         initializer=_init_worker, initargs=(self._queue,))
+        self._listener = threading.Thread(target=self._listen, name="route-job-progress", daemon=True)
+        self._listener.start()
+
+    def _listen(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            job_id, event = item
+            with self._lock:
+                job = self.jobs.get(job_id)
+                if job is not None:
+                    job.apply(event)
+
+    def submit(self, params):
+        with self._lock:
+            if self._pool is None:
+                self._start()
+            job = RouteJob(f"job-{next(self._ids)}", params)
+            self.jobs[job.id] = job
+            self._prune()
+            job.future = self._pool.submit(_run_job, self.target, job.id, params)
+        job.future.add_done_callback(lambda f, job=job: self._finish(job, f))
+        return job
+
+    def _finish(self, job, future):
+        with self._lock:
+            job.finished_at = time.time()
+            try:
+                job.result = future.result()
+                job.status = "done"
+            except Exception as e:
+                job.error = str(e) or type(e).__name__
+                job.status = "failed"
+
+    def _prune(self):
+        finished = [j for j in self.jobs.values() if j.finished_at is not None]
+        for job in sorted(finished, key=lambda j: j.finished_at)[:-MAX_FINISHED_JOBS or None]:
+            del self.jobs[job.id]
+
+    def status(self, job_id, include_result=True):
+        """Job record as a dict, or None for an unknown id."""
+        with self._lock:
+            job = self.jobs.get(job_id)
+            return job.to_dict(include_result) if job is not None else None
+
+    def run(self, params):
+        """Submit a job and block until its plan is ready (raises its error)."""
+        return self.submit(params).future.result()
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._queue.put(None)
@@ -0,0 +1,65 @@
+"""
+Array-backed model of the routing problem.
+
+Cauldrons get integer indices 0..n-1 (in the order of the cauldron list)
+and the market is node n. Capacities, fill and pour rates are NumPy arrays
+indexed by cauldron, and travel times are one dense (n+1, n+1) matrix taken
+from the networkx graph once, so the simulators never scan the cauldron
+list or walk the graph's dict-of-dicts while stepping.
+
+    model = RouteModel.build(cauldrons, market, G, SLOPE_DATA, ID_MAP)
+    model.capacity[model.index["c4"]]          # 750.0
+    model.travel[model.index["c1"], model.market]
+"""
+import networkx as nx
+import numpy as np
+
+DEFAULT_RATE = 1.0                 # L/min when slopes.json has no entry for a cauldron
+
+
+class RouteModel:
+    def __init__(self, ids, lat, lon, capacity, fill, pour, travel):
+        """
+        ids: cauldron ids (index order); lat, lon: per node, market last
+        capacity, fill, pour: per cauldron; travel: (nodes, nodes) minutes
+        """
+        self.ids = list(ids)
+        self.node_ids = self.ids + ["market"]
+        self.index = {node_id: i for i, node_id in enumerate(self.node_ids)}
+        self.market = len(self.ids)
+        self.lat = np.asarray(lat, dtype=float)
+        self.lon = np.asarray(lon, dtype=float)
+        self.capacity = np.asarray(capacity, dtype=float)
+        self.fill = np.asarray(fill, dtype=float)
+        self.pour = np.asarray(pour, dtype=float)
+        self.travel = np.asarray(travel, dtype=float)
+
+    @classmethod
+    def build(cls, cauldrons, market, G, slope_data, id_map):
+        """
+        cauldrons: [{"id", "lat", "lon", "max_volume"}]; market: {"lat", "lon"}
+        G: graph with a "weight" (minutes) on every edge between nodes
+        slope_data: slopes.json contents, keyed by id_map[cauldron id]
+        """
+        ids = [c["id"] for c in cauldrons]
+        rates = [slope_data.get(id_map[cid], {}) for cid in ids]
+        travel = nx.to_numpy_array(G, nodelist=ids + ["market"], weight="weight")
+        np.fill_diagonal(travel, 0)
+        return cls(
+            ids,
+            [c["lat"] for c in cauldrons] + [market["lat"]],
+            [c["lon"] for c in cauldrons] + [market["lon"]],
+            [c["max_volume"] for c in cauldrons],
+            [r.get("fill_rate", DEFAULT_RATE) for r in rates],
+            [r.get("pour_rate", DEFAULT_RATE) for r in rates],
+            travel,
+        )
+
+    def indices(self, node_ids):
+        """Integer indices of a list of node ids."""
+        return np.array([self.index[n] for n in node_ids], dtype=np.int64)
+
+    def point(self, node_id):
+        """{"id", "lat", "lon"} of a cauldron or the market."""
+        i = self.index[node_id]
+        return {"id": node_id, "lat": float(self.lat[i]), "lon": float(self.lon[i])}
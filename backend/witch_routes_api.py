@@ -1,10 +1,24 @@
 """
 FastAPI backend for witch routing simulation
 Exposes simulation results as JSON API
+
+Plans are expensive (Q-agents are trained per witch), so they are computed
+in the background and cached per input key (slopes.json, cauldron topology,
+search parameters); see route_cache.py. GET /api/witch-routes serves the
+cached plan, POST /api/witch-routes/recompute forces a fresh one.
+
+All training runs on a process pool (route_jobs.py) so the API process stays
+responsive; POST /api/route-jobs starts a search with custom parameters and
+GET /api/route-jobs/{id} polls its progress and result.
 """
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from typing import Optional
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from pydantic import BaseModel, Field
+import asyncio
 import math
+import multiprocessing
 import random
 import json
 import os
@@ -12,12 +26,38 @@ import sys
 from datetime import datetime
 import numpy as np
 import networkx as nx
-from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from route_cache import RoutePlanCache, digest
+from route_jobs import ROUTE_JOB_WORKERS, JobManager
+from route_model import RouteModel
 
 # Add parent directory to path to import slopes.json
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-app = FastAPI(title="Witch Routes API")
+# --------------------------------------------------------------
+# Plan cache settings
+# --------------------------------------------------------------
+PLAN_PARAMS = {"min_witches": 3, "max_witches": 99, "episodes": 400}
+STALE_WHILE_REVALIDATE = os.environ.get("WITCH_ROUTES_SWR", "1") != "0"
+INPUT_POLL_SECONDS = 30            # how often the background task checks slopes.json
+BATCH_EPISODES = 100               # training episodes stepped together by BatchWitchEnv
+# Processes for the witch-count search inside one plan computation (1 = sequential). Each of the
+# ROUTE_JOB_WORKERS job processes can run a search at once, so they share the cores between them.
+SEARCH_WORKERS = int(os.environ.get("WITCH_ROUTES_WORKERS",
+                                    max(1, (os.cpu_count() or 1) // ROUTE_JOB_WORKERS)))
+
+
+@asynccontextmanager
+async def lifespan(app):
+    task = asyncio.create_task(watch_inputs())
+    yield
+    task.cancel()
+    plan_cache.shutdown()
+    jobs.shutdown()
+
+
+app = FastAPI(title="Witch Routes API", lifespan=lifespan)
 
 # CORS configuration for React dev server
 app.add_middleware(
@@ -32,12 +72,34 @@ app.add_middleware(
 # Load slopes.json
 # --------------------------------------------------------------
 SLOPE_DATA_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "AI Model", "slopes.json")
-try:
-    with open(SLOPE_DATA_PATH) as f:
-        SLOPE_DATA = json.load(f)
-except FileNotFoundError:
-    print(f"Warning: slopes.json not found at {SLOPE_DATA_PATH}")
-    SLOPE_DATA = {}
+SLOPE_DATA = {}
+SLOPES_DIGEST = digest(SLOPE_DATA)
+_slopes_signature = None
+
+
+def reload_slopes():
+    """
+    Re-read slopes.json if it changed on disk (stat only otherwise) and
+    rebuild MODEL with the new rates.
+    """
+    global SLOPE_DATA, SLOPES_DIGEST, MODEL, _slopes_signature
+    try:
+        st = os.stat(SLOPE_DATA_PATH)
+    except FileNotFoundError:
+        if _slopes_signature != "missing":
+            print(f"Warning: slopes.json not found at {SLOPE_DATA_PATH}")
+            SLOPE_DATA, _slopes_signature = {}, "missing"
+            SLOPES_DIGEST = digest(SLOPE_DATA)
+            MODEL = RouteModel.build(cauldrons, market, G, SLOPE_DATA, ID_MAP)
+        return SLOPE_DATA
+    signature = (st.st_ino, st.st_mtime_ns, st.st_size)
+    if signature != _slopes_signature:
+        with open(SLOPE_DATA_PATH) as f:
+            SLOPE_DATA = json.load(f)
+        SLOPES_DIGEST = digest(SLOPE_DATA)
+        MODEL = RouteModel.build(cauldrons, market, G, SLOPE_DATA, ID_MAP)
+        _slopes_signature = signature
+    return SLOPE_DATA
 
 # --------------------------------------------------------------
 # ID mapping
@@ -102,84 +164,136 @@ def build_graph():
     return G
 
 G = build_graph()
+TOPOLOGY_DIGEST = digest({"cauldrons": cauldrons, "market": market})
+
+# Integer-indexed arrays (capacity, fill/pour rates, travel matrix) for the current slopes.json;
+# the simulators take the model as an argument so a plan uses one snapshot throughout
+MODEL = None
+reload_slopes()
 
 # --------------------------------------------------------------
 # Q-agent
 # --------------------------------------------------------------
 class QAgent:
-    def __init__(self, sz):
+    MEMORY = 2000                  # transitions kept for replay per concurrent episode (ring buffer)
+
+    def __init__(self, sz, memory=MEMORY):
         self.q = np.random.uniform(-1, 1, (10, 10, 10, sz))
-        self.mem = deque(maxlen=2000)
         self.eps = 1.0
+        self.memory = memory
+        self.clear_memory()
+    
+    def clear_memory(self):
+        """Drop the replay memory (the buffers are allocated again on the next remember)."""
+        self.mem_s = np.zeros((0, 3), dtype=np.float32)
+        self.mem_a = np.zeros(0, dtype=np.int64)
+        self.mem_r = np.zeros(0)
+        self.mem_s2 = np.zeros((0, 3), dtype=np.float32)
+        self.mem_d = np.zeros(0, dtype=bool)
+        self.mem_size = self.mem_next = 0
     
     def _d(self, s):
         return tuple(min(int(x * 9), 9) for x in s)
     
+    @staticmethod
+    def _cells(S):
+        """Discretized (i, j, k) index arrays for a (K, 3) batch of observations."""
+        cells = np.minimum((S * 9).astype(np.int64), 9)
+        return cells[:, 0], cells[:, 1], cells[:, 2]
+    
     def act(self, s):
         if random.random() < self.eps:
             return random.randrange(self.q.shape[3])
         return int(np.argmax(self.q[self._d(s)]))
     
+    def act_batch(self, S, eps):
+        """Epsilon-greedy actions for a (K, 3) batch; eps is a scalar or one value per row."""
+        greedy = np.argmax(self.q[self._cells(S)], axis=1)
+        explore = np.random.random(len(S)) < eps
+        return np.where(explore, np.random.randint(self.q.shape[3], size=len(S)), greedy)
+    
     def remember(self, s, a, r, s2, d):
-        self.mem.append((s, a, r, s2, d))
+        self.remember_batch(np.asarray([s]), np.asarray([a]), np.asarray([r]), np.asarray([s2]), np.asarray([d]))
     
-    def replay(self):
-        if len(self.mem) < 32:
+    def remember_batch(self, S, A, R, S2, D):
+        m = self.memory
+        if len(self.mem_a) < m:
+            self.mem_s = np.zeros((m, 3), dtype=np.float32)
+            self.mem_a = np.zeros(m, dtype=np.int64)
+            self.mem_r = np.zeros(m)
+            self.mem_s2 = np.zeros((m, 3), dtype=np.float32)
+            self.mem_d = np.zeros(m, dtype=bool)
+        if len(A) > m:
+            S, A, R, S2, D = S[-m:], A[-m:], R[-m:], S2[-m:], D[-m:]
+        rows = (self.mem_next + np.arange(len(A))) % m
+        self.mem_s[rows], self.mem_a[rows], self.mem_r[rows] = S, A, R
+        self.mem_s2[rows], self.mem_d[rows] = S2, D
+        self.mem_next = (self.mem_next + len(A)) % m
+        self.mem_size = min(m, self.mem_size + len(A))
+    
+    def replay(self, times=1):
+        """`times` replay rounds of 32 transitions each, applied in one vectorized update."""
+        if self.mem_size < 32:
             return
-        for s, a, r, s2, d in random.sample(self.mem, 32):
-            si, s2i = self._d(s), self._d(s2)
-            target = r if d else r + 0.95 * np.max(self.q[s2i])
-            self.q[si][a] += 0.001 * (target - self.q[si][a])
-        self.eps = max(0.01, self.eps * 0.995)
+        rows = np.random.randint(self.mem_size, size=32 * times)
+        si, s2i = self._cells(self.mem_s[rows]), self._cells(self.mem_s2[rows])
+        a = self.mem_a[rows]
+        target = self.mem_r[rows] + 0.95 * np.max(self.q[s2i], axis=1) * ~self.mem_d[rows]
+        np.add.at(self.q, si + (a,), 0.001 * (target - self.q[si + (a,)]))
+        self.eps = max(0.01, self.eps * 0.995 ** times)
 
 # --------------------------------------------------------------
 # Environment
 # --------------------------------------------------------------
 class WitchEnv:
-    def __init__(self, assigned):
+    """
+    One witch serving `assigned` cauldrons. Positions are integer indices
+    into `nodes` (the assigned cauldrons, then the market); the rates,
+    capacities and travel times are slices of `model`, the RouteModel the
+    plan is computed for.
+    """
+    def __init__(self, assigned, model):
         self.assigned = assigned
         self.nodes = assigned + ["market"]
-        self.idx = {n: i for i, n in enumerate(self.nodes)}
+        self.market = len(assigned)
+        self.cauldron_idx = model.indices(assigned)      # model index of each assigned cauldron
+        node_idx = np.r_[self.cauldron_idx, model.market]
+        self.travel = model.travel[np.ix_(node_idx, node_idx)]
+        self.fill = model.fill[self.cauldron_idx]
+        self.pour = model.pour[self.cauldron_idx]
+        self.cap = model.capacity[self.cauldron_idx]
         self.max_t, self.max_l, self.unload_t = 480, 2000, 15
         self.reset()
     
+    @property
+    def pos(self):
+        return self.nodes[self.p]
+    
     def reset(self):
         self.t = self.load = 0.0
-        self.pos = "market"
-        self.vol = {c["id"]: 0.0 for c in cauldrons}
+        self.p = self.market
+        self.vol = np.zeros(len(self.assigned))
         self.delivered = 0.0
         self.route = ["market"]
         return self._obs()
     
     def _obs(self):
         return np.array([
-            self.idx[self.pos] / len(self.nodes),
+            self.p / len(self.nodes),
             min(self.t / self.max_t, 1),
             min(self.load / self.max_l, 1)
         ], dtype=np.float32)
     
-    def _travel(self, to):
-        return G[self.pos][to]["weight"] if self.pos != to else 0
-    
-    def _fill(self, cid):
-        return SLOPE_DATA.get(ID_MAP[cid], {}).get("fill_rate", 1.0)
-    
-    def _pour(self, cid):
-        return SLOPE_DATA.get(ID_MAP[cid], {}).get("pour_rate", 1.0)
-    
     def step(self, a):
-        nxt = self.nodes[a]
-        travel = self._travel(nxt)
+        travel = float(self.travel[self.p, a])
         
         # All cauldrons fill up during travel time
-        for cid in self.assigned:
-            mv = next(c for c in cauldrons if c["id"] == cid)["max_volume"]
-            self.vol[cid] = min(self.vol[cid] + self._fill(cid) * travel, mv)
+        self.vol = np.minimum(self.vol + self.fill * travel, self.cap)
         
         self.t += travel
         r = -travel * 0.1
         
-        if nxt == "market":
+        if a == self.market:
             # ONLY at market: unload/dump collected potion
             self.t += self.unload_t
             r += self.load * 0.5 - self.unload_t * 0.1
@@ -187,44 +301,155 @@ class WitchEnv:
             self.load = 0.0  # Empty the witch's tank
         else:
             # At cauldrons: ONLY collect/pickup potion (cannot dump here)
-            avail = self.vol[nxt]
-            pour = self._pour(nxt)
+            avail = float(self.vol[a])
+            pour = float(self.pour[a])
             want = min(avail, self.max_l - self.load)
             coll_t = want / pour if pour > 0 else 0
             take = min(avail, pour * coll_t)
-            self.vol[nxt] -= take  # Remove from cauldron
+            self.vol[a] -= take  # Remove from cauldron
             self.load += take      # Add to witch's tank
             self.t += coll_t
             r += take * 0.2 - coll_t * 0.1
         
-        self.pos = nxt
-        self.route.append(nxt)
+        self.p = a
+        self.route.append(self.pos)
         return self._obs(), r, self.t >= self.max_t, {}
 
+class BatchWitchEnv:
+    """
+    K independent WitchEnv episodes for one cluster, held as arrays and
+    stepped with one vectorized call. Same dynamics, rewards and
+    observations as WitchEnv; rows whose episode is over ignore their action.
+    """
+    def __init__(self, assigned, k, model):
+        env = WitchEnv(assigned, model)
+        self.assigned = assigned
+        self.nodes = env.nodes
+        self.k = k
+        self.market = env.market
+        self.max_t, self.max_l, self.unload_t = env.max_t, env.max_l, env.unload_t
+        self.travel, self.fill, self.pour, self.cap = env.travel, env.fill, env.pour, env.cap
+        self._rows = np.arange(k)
+        self.reset()
+
+    def reset(self):
+        k = self.k
+        self.t = np.zeros(k)
+        self.load = np.zeros(k)
+        self.pos = np.full(k, self.market)
+        self.vol = np.zeros((k, len(self.assigned)))
+        self.delivered = np.zeros(k)
+        self.done = np.zeros(k, dtype=bool)
+        return self._obs()
+
+    def _obs(self):
+        return np.column_stack((
+            self.pos / len(self.nodes),
+            np.minimum(self.t / self.max_t, 1),
+            np.minimum(self.load / self.max_l, 1),
+        )).astype(np.float32)
+
+    def step(self, a):
+        """Advance every running episode by action a[i]; returns (obs, rewards, done)."""
+        a = np.asarray(a)
+        live = ~self.done
+        travel = np.where(live, self.travel[self.pos, a], 0.0)
+
+        # All cauldrons fill up during travel time
+        self.vol = np.minimum(self.vol + self.fill * travel[:, None], self.cap)
+        self.t += travel
+        r = -travel * 0.1
+
+        # Market: unload everything
+        unload = live & (a == self.market)
+        self.t[unload] += self.unload_t
+        r[unload] += self.load[unload] * 0.5 - self.unload_t * 0.1
+        self.delivered[unload] += self.load[unload]
+        self.load[unload] = 0.0
+
+        # Cauldron: collect what fits at the pour rate
+        rows = self._rows[live & (a != self.market)]
+        c = a[rows]
+        avail = self.vol[rows, c]
+        pour = self.pour[c]
+        want = np.minimum(avail, self.max_l - self.load[rows])
+        coll_t = np.where(pour > 0, want / np.where(pour > 0, pour, 1), 0.0)
+        take = np.minimum(avail, pour * coll_t)
+        self.vol[rows, c] -= take
+        self.load[rows] += take
+        self.t[rows] += coll_t
+        r[rows] += take * 0.2 - coll_t * 0.1
+
+        self.pos = np.where(live, a, self.pos)
+        self.done = self.t >= self.max_t
+        return self._obs(), r, self.done.copy()
+
 # --------------------------------------------------------------
 # Train / simulate
 # --------------------------------------------------------------
-def train_cluster(cl):
-    env = WitchEnv(cl)
-    ag = QAgent(len(env.nodes))
-    for _ in range(400):
+class SearchCancelled(Exception):
+    """Training stopped because a smaller witch count already succeeded."""
+
+
+def train_cluster(cl, model, episodes=400, progress=None, stop=None, batch=BATCH_EPISODES):
+    """
+    Train one agent for a cluster, `batch` episodes at a time on a
+    BatchWitchEnv. Within a batch, episode j explores with the epsilon the
+    one-at-a-time loop would have reached by then.
+
+    Differences from one episode at a time: the batch's replay rounds (one
+    per episode, as before) are applied after the whole batch, so its
+    episodes all act on the Q-table from the batch start; and the replay
+    memory holds QAgent.MEMORY transitions per concurrent episode, since a
+    batch adds up to `batch` transitions per step and a 2000-row buffer
+    would only keep the last few steps of each day.
+    """
+    ag = QAgent(len(cl) + 1, memory=QAgent.MEMORY * min(batch, episodes))
+    env = BatchWitchEnv(cl, min(batch, episodes), model)
+    for first in range(0, episodes, batch):
+        if stop is not None and stop():
+            raise SearchCancelled()
+        k = min(batch, episodes - first)
+        if k != env.k:
+            env = BatchWitchEnv(cl, k, model)
+        eps = np.maximum(0.01, ag.eps * 0.995 ** np.arange(k))
         s = env.reset()
         while True:
-            a = ag.act(s)
-            s2, r, d, _ = env.step(a)
-            ag.remember(s, a, r, s2, d)
+            live = ~env.done
+            a = ag.act_batch(s, eps)
+            s2, r, d = env.step(a)
+            ag.remember_batch(s[live], a[live], r[live], s2[live], d[live])
             s = s2
-            if d:
+            if d.all():
                 break
-        ag.replay()
+        ag.replay(k)
+        if progress:
+            progress({"event": "episodes", "done": k})
     return ag
 
-def simulate_n_witches(n):
+def make_clusters(n):
     ids = [c["id"] for c in cauldrons]
     random.shuffle(ids)
-    clusters = [ids[i::n] for i in range(n)]
-    agents = [train_cluster(cl) for cl in clusters]
-    envs = [WitchEnv(cl) for cl in clusters]
+    return [ids[i::n] for i in range(n)]
+
+def simulate_n_witches(n, model, episodes=400, progress=None, pool=None):
+    """
+    Train one agent per cluster for n witches and roll the day out.
+    pool: optional executor; the clusters are then trained in parallel.
+    """
+    clusters = make_clusters(n)
+    if pool is None:
+        agents = [train_cluster(cl, model, episodes, progress) for cl in clusters]
+    else:
+        futures = [pool.submit(_train_search_cluster, n, cl, episodes, model) for cl in clusters]
+        agents = [f.result() for f in futures]
+        if progress:
+            progress({"event": "episodes", "done": n * episodes})
+    return rollout(clusters, agents, model)
+
+def rollout(clusters, agents, model):
+    """Run the trained agents through one day; (ok, routes, volumes, delivered, schedules)."""
+    envs = [WitchEnv(cl, model) for cl in clusters]
     states = [e.reset() for e in envs]
     routes = [["market"] for _ in envs]
     
@@ -265,109 +490,200 @@ def simulate_n_witches(n):
         if done:
             break
     
-    total_vol = {cid: 0.0 for cid in ids}
+    total_vol = np.zeros(len(model.ids))
+    visited = np.zeros(len(model.ids), dtype=bool)
     total_delivered = 0.0
     for env in envs:
-        for cid, v in env.vol.items():
-            total_vol[cid] += v
+        np.add.at(total_vol, env.cauldron_idx, env.vol)
         total_delivered += env.delivered
-    
-    overflow = any(
-        total_vol[cid] > next(c for c in cauldrons if c["id"] == cid)["max_volume"]
-        for cid in total_vol
-    )
-    visited = set()
     for r in routes:
-        visited.update(r)
+        visited[[model.index[node] for node in r if node != "market"]] = True
     
+    overflow = (total_vol > model.capacity).any()
     return (
-        not overflow and len(visited & set(ids)) == len(ids),
+        bool(not overflow and visited.all()),
         routes,
-        total_vol,
+        dict(zip(model.ids, total_vol.tolist())),
         total_delivered,
         schedules
     )
 
-def find_min():
-    """Find minimum number of witches needed (minimum 3)"""
-    for n in range(3, 100):  # Start from 3 witches minimum
-        ok, routes, vols, delivered, schedules = simulate_n_witches(n)
+def find_min(min_witches=3, max_witches=99, episodes=400, progress=None, workers=1, model=None):
+    """
+    Find minimum number of witches needed (minimum 3)
+    progress: optional callable fed progress events (see route_jobs.py)
+    workers: > 1 searches witch counts and trains clusters on that many processes
+    model: RouteModel to train and score on (default: this process's MODEL);
+        search workers get it with every task instead of loading their own
+    """
+    model = model or MODEL
+    if workers > 1:
+        return _find_min_parallel(min_witches, max_witches, episodes, progress, workers, model)
+    for n in range(min_witches, max_witches + 1):  # Start from 3 witches minimum
+        if progress:
+            progress({"event": "candidate", "n": n, "episodes_total": n * episodes})
+        ok, routes, vols, delivered, schedules = simulate_n_witches(n, model, episodes, progress)
+        if progress:
+            progress(candidate_result(n, ok, routes, vols, delivered, model))
         if ok:
             return n, routes, vols, delivered, schedules
     return None, None, None, None, None
 
 # --------------------------------------------------------------
-# API Endpoints
+# Parallel search
 # --------------------------------------------------------------
-@app.get("/")
-def root():
-    return {"message": "Witch Routes API", "endpoint": "/api/witch-routes"}
+# Every (witch count, cluster) training run is one task on the search pool. Up
+# to `workers` witch counts are in flight at once, smallest first; each is
+# rolled out as soon as all its clusters are trained. Once a count succeeds
+# and every smaller one has failed, larger counts are cancelled: queued tasks
+# are dropped and running ones stop at their next episode via _search_cutoff.
+_search_cutoff = None              # shared int in search workers: abandon n > cutoff
 
-@app.get("/api/witch-routes")
-def get_witch_routes():
+
+def _init_search_worker(cutoff):
+    global _search_cutoff
+    _search_cutoff = cutoff
+
+
+def _train_search_cluster(n, cl, episodes, model):
+    stop = (lambda: n > _search_cutoff.value) if _search_cutoff is not None else None
+    ag = train_cluster(cl, model, episodes, stop=stop)
+    ag.clear_memory()              # replay memory is not needed to act; keep the pickle small
+    return ag
+
+
+def _find_min_parallel(min_witches, max_witches, episodes, progress, workers, model):
+    # A pool per search: this may run inside a route-job worker, which must not exit with live children
+    ctx = multiprocessing.get_context("spawn")
+    cutoff = ctx.Value("q", max_witches, lock=False)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                             initializer=_init_search_worker, initargs=(cutoff,)) as pool:
+        return _search(pool, cutoff, min_witches, max_witches, episodes, progress, workers, model)
+
+
+def _search(pool, cutoff, min_witches, max_witches, episodes, progress, workers, model):
+    inflight = {}                  # n -> (clusters, futures)
+    results = {}                   # n -> simulate_n_witches-style tuple
+    best = None
+    next_n = min_witches
+    try:
+        while True:
+            while (next_n <= max_witches and len(inflight) < workers
+                   and (best is None or next_n < best)):
+                clusters = make_clusters(next_n)
+                if progress:
+                    progress({"event": "candidate", "n": next_n, "episodes_total": next_n * episodes})
+                inflight[next_n] = (clusters, [pool.submit(_train_search_cluster, next_n, cl, episodes, model)
+                                               for cl in clusters])
+                next_n += 1
+            if not inflight:
+                break
+
+            wait([f for _, futures in inflight.values() for f in futures], return_when=FIRST_COMPLETED)
+            for n in sorted(inflight):
+                if n not in inflight:          # cancelled by a smaller success in this pass
+                    continue
+                clusters, futures = inflight[n]
+                if not all(f.done() for f in futures):
+                    continue
+                del inflight[n]
+                agents = [f.result() for f in futures]
+                if progress:
+                    progress({"event": "episodes", "done": n * episodes})
+                results[n] = rollout(clusters, agents, model)
+                if progress:
+                    progress(candidate_result(n, *results[n][:4], model))
+                if results[n][0] and (best is None or n < best):
+                    best = n
+                    cutoff.value = n
+                    for m in [m for m in inflight if m > n]:
+                        for f in inflight.pop(m)[1]:
+                            f.cancel()
+                        if progress:
+                            progress({"event": "cancelled", "n": m, "episodes_total": m * episodes})
+            if best is not None and not any(m < best for m in inflight):
+                break
+    finally:
+        cutoff.value = -1          # stop anything still training
+        for _, futures in inflight.values():
+            for f in futures:
+                f.cancel()
+        wait([f for _, futures in inflight.values() for f in futures])
+
+    if best is None:
+        return None, None, None, None, None
+    ok, routes, vols, delivered, schedules = results[best]
+    return best, routes, vols, delivered, schedules
+
+
+def candidate_result(n, ok, routes, vols, delivered, model):
+    """Summary of one simulated witch count, as a progress "result" event."""
+    visited = set().union(*routes)
+    volumes = np.array([vols[cid] for cid in model.ids])
+    return {
+        "event": "result",
+        "n": n,
+        "feasible": ok,
+        "delivered": delivered,
+        "overflowing": int((volumes > model.capacity).sum()),
+        "unvisited": sum(cid not in visited for cid in model.ids),
+    }
+
+# --------------------------------------------------------------
+# Plans
+# --------------------------------------------------------------
+def plan_key(params=PLAN_PARAMS):
+    """Cache key of the plan for the current inputs."""
+    reload_slopes()
+    return digest({"slopes": SLOPES_DIGEST, "topology": TOPOLOGY_DIGEST, "params": params})
+
+
+def compute_plan(params=PLAN_PARAMS, progress=None):
     """
-    Calculate optimal witch routes and return simulation data
-    Returns:
-        {
-            "n_witches": int,
-            "routes": list of lists (witch paths),
-            "volumes": dict (final cauldron volumes),
-            "delivered": float (total delivered to market),
-            "cauldrons": list (cauldron positions and metadata),
-            "market": dict (market position),
-            "schedules": list of daily schedules for each witch
-        }
+    Run the witch-count search and build the /api/witch-routes response.
+    Runs in a long-lived job worker, so slopes.json is re-checked here: the
+    plan is trained and scored on the rates on disk now, not on the ones
+    this process happened to load at import. Only the default PLAN_PARAMS
+    plan is saved to witch_schedules.json.
     """
-    try:
-        n, routes, vols, delivered, schedules = find_min()
-        
-        if n is None:
-            raise HTTPException(status_code=500, detail="Failed to find optimal route")
+    reload_slopes()
+    model = MODEL
+    n, routes, vols, delivered, schedules = find_min(**params, progress=progress, workers=SEARCH_WORKERS,
+                                                     model=model)
+    if n is None:
+        raise RuntimeError("Failed to find optimal route")
+    return build_plan(n, routes, vols, delivered, schedules, model, save_schedule=params == PLAN_PARAMS)
+
+
+def build_plan(n, routes, vols, delivered, schedules, model, save_schedule=True):
+    # Convert routes to coordinate paths for frontend
+    route_coords = [[model.point(node) for node in route] for route in routes]
+    
+    # Format schedules with just the path for each witch
+    formatted_schedules = []
+    for witch_idx, schedule in enumerate(schedules):
+        # Extract just the path (sequence of locations)
+        path = []
+        if schedule:
+            path.append(schedule[0]["from"])  # Starting location
+            for activity in schedule:
+                path.append(activity["to"])  # Add each destination
         
-        # Convert routes to coordinate paths for frontend
-        route_coords = []
-        for route in routes:
-            path = []
-            for node in route:
-                if node == "market":
-                    path.append({
-                        "id": "market",
-                        "lat": market["lat"],
-                        "lon": market["lon"]
-                    })
-                else:
-                    c = next(x for x in cauldrons if x["id"] == node)
-                    path.append({
-                        "id": c["id"],
-                        "lat": c["lat"],
-                        "lon": c["lon"]
-                    })
-            route_coords.append(path)
+        # Remove consecutive duplicates
+        deduplicated_path = []
+        for location in path:
+            if not deduplicated_path or deduplicated_path[-1] != location:
+                deduplicated_path.append(location)
         
-        # Format schedules with just the path for each witch
-        formatted_schedules = []
-        for witch_idx, schedule in enumerate(schedules):
-            # Extract just the path (sequence of locations)
-            path = []
-            if schedule:
-                path.append(schedule[0]["from"])  # Starting location
-                for activity in schedule:
-                    path.append(activity["to"])  # Add each destination
-            
-            # Remove consecutive duplicates
-            deduplicated_path = []
-            for location in path:
-                if not deduplicated_path or deduplicated_path[-1] != location:
-                    deduplicated_path.append(location)
-            
-            witch_schedule = {
-                "witch_id": witch_idx + 1,
-                "path": deduplicated_path
-            }
-            
-            formatted_schedules.append(witch_schedule)
+        witch_schedule = {
+            "witch_id": witch_idx + 1,
+            "path": deduplicated_path
+        }
         
-        # Save schedules to JSON file
+        formatted_schedules.append(witch_schedule)
+    
+    # Save schedules to JSON file
+    if save_schedule:
         schedule_output = {
             "timestamp": datetime.now().isoformat(),
             "n_witches": n,
@@ -382,32 +698,136 @@ def get_witch_routes():
             print(f"Schedule saved to {schedule_file_path}")
         except Exception as e:
             print(f"Warning: Could not save schedule file: {e}")
-        
-        # Add volume ratio to cauldrons
-        cauldrons_with_status = []
-        for c in cauldrons:
-            vol = vols.get(c["id"], 0)
-            ratio = vol / c["max_volume"]
-            cauldrons_with_status.append({
-                **c,
-                "current_volume": vol,
-                "ratio": ratio,
-                "status": "critical" if ratio > 0.9 else "warning" if ratio > 0.7 else "ok"
-            })
-        
-        return {
-            "n_witches": n,
-            "routes": route_coords,
-            "volumes": vols,
-            "delivered": delivered,
-            "cauldrons": cauldrons_with_status,
-            "market": market,
-            "schedules": formatted_schedules
-        }
     
+    # Add volume ratio to cauldrons
+    cauldrons_with_status = []
+    ratios = np.array([vols.get(cid, 0) for cid in model.ids]) / model.capacity
+    for c, ratio in zip(cauldrons, ratios.tolist()):
+        vol = vols.get(c["id"], 0)
+        cauldrons_with_status.append({
+            **c,
+            "current_volume": vol,
+            "ratio": ratio,
+            "status": "critical" if ratio > 0.9 else "warning" if ratio > 0.7 else "ok"
+        })
+    
+    return {
+        "n_witches": n,
+        "routes": route_coords,
+        "volumes": vols,
+        "delivered": delivered,
+        "cauldrons": cauldrons_with_status,
+        "market": market,
+        "schedules": formatted_schedules
+    }
+
+
+jobs = JobManager(compute_plan)
+plan_cache = RoutePlanCache(jobs.run, stale_while_revalidate=STALE_WHILE_REVALIDATE)
+
+
+async def watch_inputs():
+    """Compute the plan at startup and again whenever the inputs change."""
+    while True:
+        try:
+            plan_cache.refresh(plan_key(), PLAN_PARAMS)
+        except Exception as e:
+            print(f"Warning: could not schedule route plan: {e}")
+        await asyncio.sleep(INPUT_POLL_SECONDS)
+
+
+# --------------------------------------------------------------
+# API Endpoints
+# --------------------------------------------------------------
+@app.get("/")
+def root():
+    return {"message": "Witch Routes API", "endpoint": "/api/witch-routes"}
+
+@app.get("/api/witch-routes")
+def get_witch_routes(request: Request):
+    """
+    Optimal witch routes from the plan cache. The first request after
+    startup waits for the initial computation; afterwards the cached plan
+    is served as-is (X-Plan-Stale: true while a plan for changed inputs is
+    being computed in stale-while-revalidate mode).
+    Returns:
+        {
+            "n_witches": int,
+            "routes": list of lists (witch paths),
+            "volumes": dict (final cauldron volumes),
+            "delivered": float (total delivered to market),
+            "cauldrons": list (cauldron positions and metadata),
+            "market": dict (market position),
+            "schedules": list of daily schedules for each witch
+        }
+    """
+    try:
+        entry, stale = plan_cache.get(plan_key(), PLAN_PARAMS)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+    headers = {"ETag": entry.etag, "X-Plan-Stale": "true" if stale else "false"}
+    if request.headers.get("If-None-Match") == entry.etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+@app.post("/api/witch-routes/recompute", status_code=202)
+def recompute_witch_routes(wait: bool = False):
+    """Start a fresh plan computation for the current inputs (wait=true blocks until done)."""
+    key = plan_key()
+    future = plan_cache.refresh(key, PLAN_PARAMS, force=True)
+    if wait:
+        try:
+            entry = future.result()
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+        return {"status": "done", "key": key, "n_witches": entry.plan["n_witches"],
+                "seconds": round(entry.seconds, 3)}
+    return {"status": "computing", "key": key}
+
+class RouteJobParams(BaseModel):
+    min_witches: int = Field(PLAN_PARAMS["min_witches"], ge=1)
+    max_witches: int = Field(PLAN_PARAMS["max_witches"], ge=1)
+    episodes: int = Field(PLAN_PARAMS["episodes"], ge=1, le=20000)
+
+@app.post("/api/route-jobs", status_code=202)
+def create_route_job(params: Optional[RouteJobParams] = None):
+    """Start a route optimization on the process pool; poll GET /api/route-jobs/{job_id}."""
+    params = (params or RouteJobParams()).model_dump()
+    if params["max_witches"] < params["min_witches"]:
+        raise HTTPException(status_code=422, detail="max_witches must be >= min_witches")
+    job = jobs.submit(params)
+    return {"job_id": job.id, "status": job.status, "poll": f"/api/route-jobs/{job.id}"}
+
+@app.get("/api/route-jobs/{job_id}")
+def get_route_job(job_id: str):
+    """
+    Job status and progress: current witch count n, episodes done/total,
+    best candidate so far; "result" holds the plan once status is "done".
+    """
+    status = jobs.status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    return status
+
+@app.get("/api/witch-routes/status")
+def witch_routes_status():
+    """Cache state: current input key, whether its plan is cached, computes in flight."""
+    key = plan_key()
+    entry = plan_cache.entries.get(key)
+    latest = plan_cache.latest
+    retry_at = plan_cache.retry_at(key)
+    return {
+        "key": key,
+        "cached": entry is not None,
+        "computing": key in plan_cache.computing(),
+        "stale_while_revalidate": plan_cache.stale_while_revalidate,
+        "latest_computed_at": datetime.fromtimestamp(latest.computed_at).isoformat() if latest else None,
+        "latest_seconds": round(latest.seconds, 3) if latest else None,
+        "error": plan_cache.errors.get(key),
+        "retry_at": datetime.fromtimestamp(retry_at).isoformat() if retry_at else None,
+    }
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,64 @@
+"""
+Benchmark: array-based drain extraction (SlopeAnalyzer.drains) vs the
+Timestamp-based inflection_points + index_negative_intervals_by_date path.
+
+The RDP step is shared, so only the drain extraction itself is timed.
+
+Usage:
+    python bench_drains.py                        # 1 week, 3 months, 1 year of minutes
+    python bench_drains.py --sizes 10080 525600
+"""
+import argparse
+import time
+
+import numpy as np
+
+from slope_analyzer import SlopeAnalyzer, index_negative_intervals_by_date
+
+START = 1761782400                                # 2025-10-30T00:00:00Z
+
+
+def make_levels(n, seed=0):
+    """Minute levels: noisy fill, 8-minute drain roughly every 10 hours."""
+    rng = np.random.default_rng(seed)
+    step = 0.3 + rng.normal(0, 0.05, n)
+    step[(np.arange(n) % 600) < 8] = -12.0
+    return 300 + np.cumsum(step)
+
+
+def timed(fn, *args, repeat=3, **kwargs):
+    best, out = float("inf"), None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn(*args, **kwargs)
+        best = min(best, time.perf_counter() - t0)
+    return out, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[7 * 1440, 90 * 1440, 365 * 1440])
+    parser.add_argument("--epsilon", type=float, default=20)
+    args = parser.parse_args()
+
+    import pandas as pd
+
+    print(f"{'minutes':>9} {'drains':>7} {'timestamp path':>15} {'drains()':>10} {'speedup':>8} {'same':>5}")
+    for n in args.sizes:
+        times = START + 60 * np.arange(n, dtype=np.int64)
+        an = SlopeAnalyzer(pd.to_datetime(times, unit="s", utc=True), make_levels(n), epsilon=args.epsilon)
+        rate = an.average_positive_slope()
+
+        def timestamp_path():
+            return index_negative_intervals_by_date(an.inflection_points(), rate)
+
+        by_date, t_old = timed(timestamp_path)
+        drains, t_new = timed(an.drains, fill_rate=rate)
+
+        old_volumes = np.array([e["drain_volume"] for day in by_date.values() for e in day])
+        same = np.array_equal(old_volumes, drains["volume"])
+        print(f"{n:>9} {len(drains):>7} {t_old:>14.4f}s {t_new:>9.5f}s {t_old / t_new:>7.0f}x {str(same):>5}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Startup-time benchmark: importing the analysis library must stay cheap.
+
+Each module is imported in a fresh interpreter several times; the best time
+must be under the budget, and none of the heavy modules (pandas, requests,
+rdp) may be loaded as a side effect. Exits non-zero on regression.
+
+Usage:
+    python bench_import.py
+    python bench_import.py --budget-ms 100 --runs 5 slope_analyzer simplify
+"""
+import argparse
+import json
+import subprocess
+import sys
+
+HEAVY_MODULES = ("pandas", "requests", "rdp")
+
+_PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - t0
+print(json.dumps({{"ms": elapsed * 1000, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def probe(module):
+    out = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(module=module, heavy=HEAVY_MODULES)],
+        capture_output=True, text=True, check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("modules", nargs="*", default=["slope_analyzer"])
+    parser.add_argument("--budget-ms", type=float, default=100)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    failed = False
+    for module in args.modules:
+        results = [probe(module) for _ in range(args.runs)]
+        best = min(r["ms"] for r in results)
+        heavy = sorted({m for r in results for m in r["heavy"]})
+
+        ok = best < args.budget_ms and not heavy
+        failed |= not ok
+        note = f"  loads {', '.join(heavy)}" if heavy else ""
+        print(f"{'OK  ' if ok else 'FAIL'} import {module}: {best:.1f} ms (budget {args.budget_ms:.0f} ms){note}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
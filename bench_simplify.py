@@ -0,0 +1,61 @@
+"""
+Benchmark: simplify.rdp vs the `rdp` package on synthetic fill/drain series.
+
+Usage:
+    python bench_simplify.py                       # 1k, 100k, 1M points
+    python bench_simplify.py --sizes 1000 100000   # custom sizes
+    python bench_simplify.py --rdp-max 100000      # skip the slow package above this size
+"""
+import argparse
+import time
+
+import numpy as np
+
+from simplify import rdp as fast_rdp
+
+
+def make_series(n, seed=0):
+    """Sawtooth tank level: slow noisy fill, sharp drain every ~12 hours."""
+    rng = np.random.default_rng(seed)
+    step = np.full(n, 0.08) + rng.normal(0, 0.05, n)
+    step[(np.arange(n) % 700) < 40] = -4.0
+    levels = 200 + np.cumsum(step)
+    return np.column_stack((np.arange(n, dtype=float), levels))
+
+
+def timed(fn, *args, **kwargs):
+    t0 = time.perf_counter()
+    out = fn(*args, **kwargs)
+    return out, time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 100_000, 1_000_000])
+    parser.add_argument("--epsilon", type=float, default=20)
+    parser.add_argument("--rdp-max", type=int, default=None,
+                        help="largest size to run the `rdp` package on (default: all)")
+    args = parser.parse_args()
+
+    try:
+        from rdp import rdp as pkg_rdp
+    except ImportError:
+        pkg_rdp = None
+        print("`rdp` package not installed; timing simplify.rdp only.")
+
+    print(f"{'points':>10} {'vertices':>9} {'simplify.rdp':>13} {'rdp pkg':>10} {'speedup':>9} {'same':>5}")
+    for n in args.sizes:
+        pts = make_series(n)
+        fast, t_fast = timed(fast_rdp, pts, epsilon=args.epsilon)
+
+        if pkg_rdp is None or (args.rdp_max is not None and n > args.rdp_max):
+            print(f"{n:>10} {len(fast):>9} {t_fast:>12.4f}s {'-':>10} {'-':>9} {'-':>5}")
+            continue
+
+        ref, t_ref = timed(pkg_rdp, pts, epsilon=args.epsilon)
+        same = ref.shape == fast.shape and np.allclose(ref, fast)
+        print(f"{n:>10} {len(fast):>9} {t_fast:>12.4f}s {t_ref:>9.3f}s {t_ref / t_fast:>8.0f}x {str(same):>5}")
+
+
+if __name__ == "__main__":
+    main()
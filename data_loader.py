@@ -0,0 +1,157 @@
+"""
+Columnar loader for the /api/Data level history.
+
+The API returns one JSON object per minute:
+    {"timestamp": "2025-10-30T00:00:00+00:00", "cauldron_levels": {"cauldron_001": 226.98, ...}}
+
+Instead of flattening that into one [timestamp, cauldron_id, level] row per
+reading, the payload is parsed straight into a wide layout:
+    times   -> int64 array of epoch seconds (one shared time axis)
+    levels  -> float array of shape (n_times, n_cauldrons), NaN where missing
+The long DataFrame the analysis scripts used before is still available
+through LevelFrame.to_long().
+"""
+from operator import itemgetter
+
+import numpy as np
+
+BASE_URL = "https://hackutd2025.eog.systems"
+DATA_URL = f"{BASE_URL}/api/Data"
+
+_UTC_SUFFIXES = ("+00:00", "Z")
+
+
+class LevelFrame:
+    def __init__(self, times, cauldron_ids, levels):
+        """
+        times: int64 array of epoch seconds, sorted ascending
+        cauldron_ids: list of cauldron ids, one per column of `levels`
+        levels: float array of shape (len(times), len(cauldron_ids))
+        """
+        self.times = np.asarray(times, dtype=np.int64)
+        self.cauldron_ids = list(cauldron_ids)
+        self.levels = np.asarray(levels, dtype=float).reshape(len(self.times), len(self.cauldron_ids))
+        self._col = {cid: i for i, cid in enumerate(self.cauldron_ids)}
+
+    def __len__(self):
+        return len(self.times)
+
+    def __contains__(self, cauldron_id):
+        return cauldron_id in self._col
+
+    def column(self, cauldron_id):
+        """Raw level column for one cauldron (may contain NaN)."""
+        return self.levels[:, self._col[cauldron_id]]
+
+    def series(self, cauldron_id):
+        """(times, levels) for one cauldron with missing readings dropped."""
+        col = self.column(cauldron_id)
+        ok = ~np.isnan(col)
+        if ok.all():
+            return self.times, col
+        return self.times[ok], col[ok]
+
+    def between(self, start=None, end=None):
+        """Rows with start <= time <= end (epoch seconds), as a new LevelFrame."""
+        lo = 0 if start is None else np.searchsorted(self.times, start, side="left")
+        hi = len(self.times) if end is None else np.searchsorted(self.times, end, side="right")
+        return LevelFrame(self.times[lo:hi], self.cauldron_ids, self.levels[lo:hi])
+
+    def datetimes(self):
+        """Time axis as a tz-aware (UTC) pandas DatetimeIndex."""
+        import pandas as pd
+        return pd.to_datetime(self.times, unit="s", utc=True)
+
+    def to_wide(self):
+        """DataFrame indexed by timestamp with one column per cauldron."""
+        import pandas as pd
+        return pd.DataFrame(self.levels, index=self.datetimes(), columns=self.cauldron_ids)
+
+    def to_long(self):
+        """
+        Long-format DataFrame with columns [timestamp, cauldron_id, level],
+        sorted by timestamp, matching what the scripts used to build by hand.
+        """
+        import pandas as pd
+        n_t, n_c = self.levels.shape
+        df = pd.DataFrame({
+            "timestamp": np.repeat(self.datetimes(), n_c),
+            "cauldron_id": np.tile(np.array(self.cauldron_ids, dtype=object), n_t),
+            "level": self.levels.ravel(),
+        })
+        return df[~np.isnan(df["level"].to_numpy())].reset_index(drop=True)
+
+    def to_records(self):
+        """
+        Rows back in the /api/Data shape:
+            [{"timestamp": "...+00:00", "cauldron_levels": {cid: level, ...}}, ...]
+        Missing readings are left out of cauldron_levels.
+        """
+        stamps = np.datetime_as_string(self.times.astype("datetime64[s]"))
+        records = []
+        for stamp, row in zip(stamps, self.levels.tolist()):
+            records.append({
+                "timestamp": f"{stamp}+00:00",
+                "cauldron_levels": {cid: v for cid, v in zip(self.cauldron_ids, row) if v == v},
+            })
+        return records
+
+
+def _parse_times(stamps):
+    """ISO-8601 strings -> int64 epoch seconds."""
+    if all(s.endswith(_UTC_SUFFIXES) for s in stamps):
+        # Fast path: everything the API sends is UTC, so drop the suffix and
+        # let NumPy parse the naive strings in one C call.
+        naive = [s[:-1] if s.endswith("Z") else s[:-6] for s in stamps]
+        return np.array(naive, dtype="datetime64[s]").astype(np.int64)
+    import pandas as pd
+    return pd.to_datetime(stamps, utc=True, format="ISO8601").as_unit("s").asi8
+
+
+def parse_levels(payload, cauldron_ids=None):
+    """
+    Parse a /api/Data JSON payload (list of dicts) into a LevelFrame.
+
+    cauldron_ids: optional column order; defaults to the sorted union of ids
+    seen in the payload.
+    """
+    if not payload:
+        return LevelFrame(np.empty(0, dtype=np.int64), cauldron_ids or [], np.empty((0, len(cauldron_ids or []))))
+
+    level_dicts = [entry["cauldron_levels"] for entry in payload]
+    if cauldron_ids is None:
+        ids = set(level_dicts[0])
+        for d in level_dicts:
+            if d.keys() != ids:
+                ids.update(d)
+        cauldron_ids = sorted(ids)
+
+    try:
+        getter = itemgetter(*cauldron_ids)
+        rows = [getter(d) for d in level_dicts]
+    except KeyError:
+        # Some minutes are missing a cauldron; fall back to NaN-filling.
+        rows = [tuple(d.get(cid, np.nan) for cid in cauldron_ids) for d in level_dicts]
+
+    levels = np.array(rows, dtype=float).reshape(len(rows), len(cauldron_ids))
+    times = _parse_times([entry["timestamp"] for entry in payload])
+
+    if len(times) > 1 and np.any(times[1:] < times[:-1]):
+        order = np.argsort(times, kind="stable")
+        times, levels = times[order], levels[order]
+
+    return LevelFrame(times, cauldron_ids, levels)
+
+
+def fetch_levels(start_date=0, end_date=None, base_url=BASE_URL, client=None):
+    """
+    Download /api/Data for [start_date, end_date] (epoch seconds) into a LevelFrame.
+    client: optional api_client.ApiClient to reuse its connection pool.
+    """
+    import time
+    from api_client import ApiClient
+
+    if end_date is None:
+        end_date = int(time.time())
+    client = client or ApiClient(base_url)
+    return parse_levels(client.data(start_date, end_date))
@@ -1,6 +1,12 @@
+import json
+import os
 import time
-import requests
+from pathlib import Path
+
 from elasticsearch import Elasticsearch
+from api_client import ApiClient
+from data_loader import parse_levels
+from es_bulk import bulk_index
 
 # === CONFIGURATION ===
 API_URL = "https://hackutd2025.eog.systems/api/Data"  # Base endpoint; params added dynamically
@@ -8,6 +14,15 @@ ELASTIC_HOST = "localhost"
 ELASTIC_PORT = 9200
 ELASTIC_INDEX = "api_data_index"  # New index name
 
+# Bulk ingestion tuning (see es_bulk.py)
+BULK_CHUNK_DOCS = 2000             # docs per _bulk request
+BULK_CHUNK_BYTES = 5 * 1024 * 1024 # bytes per _bulk request
+BULK_WORKERS = 2                   # concurrent _bulk requests
+
+# Incremental ingestion: only [checkpoint - LATE_ARRIVAL_SECONDS, now] is fetched each tick
+STATE_FILE = Path(__file__).resolve().parent / ".elastic_ingest_state.json"
+LATE_ARRIVAL_SECONDS = 15 * 60     # re-read window for late or corrected readings
+
 # If authentication is needed, add http_auth=("user", "pass")
 es = Elasticsearch(["http://localhost:9200"], http_auth=('elastic', 'nf4caJQE'),)
 
@@ -48,45 +63,86 @@ def create_index(index_name):
 
 create_index(ELASTIC_INDEX)
 
-# Build data URL with required time range parameters.
-# NOTE: Using start_date=0 every minute will re-fetch the entire history and re-index all docs.
-# Consider changing to incremental: keep last_end = previous end_date and advance.
-def build_data_url():
-    current_unix = int(time.time())
-    return f"{API_URL}?start_date=0&end_date={current_unix + (6*60*60)}"
+# Pooled, retrying client (see api_client.py)
+api = ApiClient(API_URL.rsplit("/api/", 1)[0])
+
+
+# High-water mark: epoch second of the newest reading that was fully indexed
+def load_checkpoint():
+    """
+    Read the checkpoint from STATE_FILE. If the file is missing or belongs to
+    another index (first run, or it was deleted) fall back to the newest timestamp already in the index,
+    so a restart never re-ingests the whole history.
+    """
+    if STATE_FILE.exists():
+        state = json.loads(STATE_FILE.read_text())
+        if state.get("index") == ELASTIC_INDEX:
+            return state.get("last_indexed_ts")
+    try:
+        result = es.search(index=ELASTIC_INDEX, size=0,
+                           aggs={"newest": {"max": {"field": "timestamp"}}})
+        newest_ms = result["aggregations"]["newest"]["value"]
+        return int(newest_ms // 1000) if newest_ms is not None else None
+    except Exception as e:
+        print(f"Could not read checkpoint from index: {e}")
+        return None
+
+
+def save_checkpoint(ts):
+    # Write-then-rename so a crash never leaves a half-written state file
+    tmp = STATE_FILE.with_suffix(".tmp")
+    tmp.write_text(json.dumps({"index": ELASTIC_INDEX, "last_indexed_ts": ts}))
+    os.replace(tmp, STATE_FILE)
+
+
+# Bulk actions: one doc per reading, keyed by timestamp so re-pushes overwrite
+def build_actions(items):
+    for item in items:
+        if isinstance(item, dict) and "timestamp" in item:
+            yield {"_index": ELASTIC_INDEX, "_id": item["timestamp"], "_source": item}
+        elif isinstance(item, dict):
+            yield {"_index": ELASTIC_INDEX, "_source": item}
+        else:
+            yield {"_index": ELASTIC_INDEX, "_source": {"value": item}}
 
 # Main loop: fetch and push every 1 minute
 def fetch_and_push():
+    checkpoint = load_checkpoint()
+    print(f"Resuming from checkpoint: {checkpoint}")
     while True:
         try:
-            url = build_data_url()
-            response = requests.get(url)
-            response.raise_for_status()
-            data = response.json()
-            
-            # If data is a list, index each item using 'timestamp' as the document ID
-            if isinstance(data, list):
-                pushed = 0
-                for item in data:
-                    if isinstance(item, dict) and "timestamp" in item:
-                        es.index(index=ELASTIC_INDEX, id=(item["timestamp"]), document=item)
-                        pushed += 1
-                    elif isinstance(item, dict):
-                        es.index(index=ELASTIC_INDEX, document=item)
-                        pushed += 1
-                    else:
-                        es.index(index=ELASTIC_INDEX, document={"value": item})
-                        pushed += 1
-                print(f"Pushed {pushed} items at {time.strftime('%Y-%m-%d %H:%M:%S')}")
-            elif isinstance(data, dict):
-                if "fields" in data and "timestamp" in data["fields"]:
-                    es.index(index=ELASTIC_INDEX, id=data["fields"]["timestamp"], document=data)
-                else:
-                    es.index(index=ELASTIC_INDEX, document=data)
-                print(f"Pushed 1 item at {time.strftime('%Y-%m-%d %H:%M:%S')}")
+            # Only the window since the last indexed reading (plus a late-arrival
+            # margin) is fetched. Docs are keyed by timestamp, so re-sending the
+            # overlap just overwrites the same docs.
+            start_date = 0 if checkpoint is None else max(0, checkpoint - LATE_ARRIVAL_SECONDS)
+            end_date = int(time.time()) + (6*60*60)
+            data = api.data(start_date, end_date)
+            if not data:
+                print(f"No new readings since {start_date} at {time.strftime('%Y-%m-%d %H:%M:%S')}")
+                time.sleep(60)
+                continue
+
+            report = bulk_index(
+                es,
+                build_actions(data),
+                chunk_docs=BULK_CHUNK_DOCS,
+                chunk_bytes=BULK_CHUNK_BYTES,
+                workers=BULK_WORKERS,
+            )
+            print(f"Pushed {report.summary()} at {time.strftime('%Y-%m-%d %H:%M:%S')}")
+            for error in report.errors:
+                print(f"  Failed: {error}")
+            for line in api.metrics.summary():
+                print(f"  API {line}")
+
+            # Advance only after a clean push; on failure the same window is retried
+            if report.failed == 0:
+                newest = int(parse_levels(data).times[-1])
+                if checkpoint is None or newest > checkpoint:
+                    checkpoint = newest
+                    save_checkpoint(checkpoint)
             else:
-                es.index(index=ELASTIC_INDEX, document={"value": data})
-                print(f"Pushed 1 primitive item at {time.strftime('%Y-%m-%d %H:%M:%S')}")
+                print(f"  Checkpoint kept at {checkpoint}; window will be retried")
         except Exception as e:
             print(f"Error: {e}")
         time.sleep(60)  # Wait 1 minute
@@ -0,0 +1,262 @@
+"""
+Batched Elasticsearch ingestion shared by the middleware scripts.
+
+Actions are grouped into batches capped by document count and serialized
+size, and each batch goes out as one _bulk request through
+helpers.streaming_bulk. With workers > 1, batches are sent from a thread
+pool (the same model as helpers.parallel_bulk), but each batch is still timed
+on its own so the report has per-batch latency and failures.
+
+DiffPublisher sits in front of bulk_index for documents that are rewritten
+on a timer (the geo points): it remembers what was last published per
+document and only sends what changed, as partial updates.
+"""
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from elasticsearch import helpers
+
+BULK_CHUNK_DOCS = 2000                 # max documents per _bulk request
+BULK_CHUNK_BYTES = 5 * 1024 * 1024     # max serialized bytes per _bulk request
+BULK_WORKERS = 1                       # concurrent _bulk requests
+
+MAX_REPORTED_ERRORS = 10
+
+
+class BulkReport:
+    def __init__(self):
+        self.batches = []        # (docs, bytes, seconds, failed) per batch
+        self.ok = 0
+        self.failed = 0
+        self.errors = []         # first MAX_REPORTED_ERRORS failure items
+        self.elapsed = 0.0
+        self.skipped = 0         # docs not sent because nothing changed (DiffPublisher)
+
+    @property
+    def docs_per_sec(self):
+        return (self.ok + self.failed) / self.elapsed if self.elapsed > 0 else 0.0
+
+    def summary(self):
+        latencies = sorted(b[2] for b in self.batches)
+        p50 = latencies[len(latencies) // 2] * 1000 if latencies else 0.0
+        worst = latencies[-1] * 1000 if latencies else 0.0
+        skipped = f", {self.skipped} skipped" if self.skipped else ""
+        return (f"{self.ok} ok, {self.failed} failed{skipped} in {len(self.batches)} batch(es), "
+                f"{self.elapsed:.2f}s ({self.docs_per_sec:,.0f} docs/s, "
+                f"batch p50 {p50:.0f} ms, max {worst:.0f} ms)")
+
+    def merge(self, other):
+        """Add another report's batches and counters (elapsed is left to the caller)."""
+        self.batches += other.batches
+        self.ok += other.ok
+        self.failed += other.failed
+        self.errors.extend(other.errors[:MAX_REPORTED_ERRORS - len(self.errors)])
+        self.skipped += other.skipped
+
+
+def _action_size(action):
+    """Rough serialized size of one action (metadata line + source line)."""
+    source = action.get("_source", action.get("doc", action))
+    return len(json.dumps(source, default=str)) + 100
+
+
+def iter_batches(actions, chunk_docs=BULK_CHUNK_DOCS, chunk_bytes=BULK_CHUNK_BYTES):
+    """Yield (batch, n_bytes) lists of actions capped by count and size."""
+    batch, size = [], 0
+    for action in actions:
+        n = _action_size(action)
+        if batch and (len(batch) >= chunk_docs or size + n > chunk_bytes):
+            yield batch, size
+            batch, size = [], 0
+        batch.append(action)
+        size += n
+    if batch:
+        yield batch, size
+
+
+def _send_batch(es, batch, n_bytes):
+    t0 = time.perf_counter()
+    ok = failed = 0
+    errors = []
+    for success, info in helpers.streaming_bulk(
+        es, batch,
+        chunk_size=len(batch),
+        max_chunk_bytes=max(n_bytes * 2, BULK_CHUNK_BYTES),
+        raise_on_error=False,
+        raise_on_exception=False,
+    ):
+        if success:
+            ok += 1
+        else:
+            failed += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append(info)
+    return len(batch), n_bytes, time.perf_counter() - t0, ok, failed, errors
+
+
+def bulk_index(es, actions, chunk_docs=BULK_CHUNK_DOCS, chunk_bytes=BULK_CHUNK_BYTES,
+               workers=BULK_WORKERS, log=print):
+    """
+    Send an iterable of bulk actions ({"_index", "_id", "_source"} or
+    {"_op_type": "update", ...}) and return a BulkReport.
+    log: called with one line per batch; pass None to stay quiet.
+    """
+    report = BulkReport()
+    t0 = time.perf_counter()
+
+    def record(result):
+        n_docs, n_bytes, seconds, ok, failed, errors = result
+        report.batches.append((n_docs, n_bytes, seconds, failed))
+        report.ok += ok
+        report.failed += failed
+        report.errors.extend(errors[:MAX_REPORTED_ERRORS - len(report.errors)])
+        if log:
+            log(f"  batch {len(report.batches)}: {n_docs} docs, {n_bytes / 1024:.0f} KB, "
+                f"{seconds * 1000:.0f} ms, {failed} failed")
+
+    if workers <= 1:
+        for batch, n_bytes in iter_batches(actions, chunk_docs, chunk_bytes):
+            record(_send_batch(es, batch, n_bytes))
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            pending = []
+            for batch, n_bytes in iter_batches(actions, chunk_docs, chunk_bytes):
+                pending.append(pool.submit(_send_batch, es, batch, n_bytes))
+                if len(pending) >= workers * 2:      # bound the number of batches held in memory
+                    record(pending.pop(0).result())
+            for future in pending:
+                record(future.result())
+
+    report.elapsed = time.perf_counter() - t0
+    return report
+
+
+class DiffPublisher:
+    """
+    Publish documents that are regenerated every tick while writing only
+    what changed since the last successful publish:
+      - unseen doc (or one that lost a field) -> full index action
+      - changed fields                        -> partial update (_op_type: update)
+      - nothing changed                       -> no write, counted as skipped
+      - gone from docs (only with prune=True) -> delete
+
+    deadbands: {field: threshold}; a numeric change smaller than threshold
+    is treated as no change. The comparison is against the last *published*
+    value, so slow drift still goes out once it adds up to the threshold.
+
+    State only advances on success: if any write in a publish fails, the
+    docs of that publish are forgotten and sent in full next time.
+    """
+
+    def __init__(self, deadbands=None):
+        self.deadbands = dict(deadbands or {})
+        self.published = {}      # (index, _id) -> last published doc
+
+    def _changed_fields(self, old, new):
+        changed = {}
+        for field, value in new.items():
+            before = old.get(field)
+            if value == before:
+                continue
+            threshold = self.deadbands.get(field)
+            if (threshold and isinstance(value, (int, float)) and isinstance(before, (int, float))
+                    and abs(value - before) < threshold):
+                continue
+            changed[field] = value
+        return changed
+
+    def plan(self, index, docs, prune=False):
+        """
+        Bulk actions for {doc_id: doc} into `index`, plus the number of docs
+        skipped and the state to record once the actions succeed (None marks
+        a deleted doc). prune: delete previously published docs of `index`
+        that are not in `docs`.
+        """
+        actions, staged, skipped = [], {}, 0
+        if prune:
+            actions, staged = self._delete_actions(index, docs)
+        for doc_id, doc in docs.items():
+            key = (index, doc_id)
+            old = self.published.get(key)
+            if old is None or old.keys() - doc.keys():
+                actions.append({"_index": index, "_id": doc_id, "_source": doc})
+                staged[key] = dict(doc)
+                continue
+            changed = self._changed_fields(old, doc)
+            if not changed:
+                skipped += 1
+                continue
+            actions.append({"_op_type": "update", "_index": index, "_id": doc_id, "doc": changed})
+            staged[key] = {**old, **changed}
+        return actions, skipped, staged
+
+    def _delete_actions(self, index, keep):
+        """Delete actions (and staged None state) for published docs of `index` not in `keep`."""
+        actions, staged = [], {}
+        for key in [k for k in self.published if k[0] == index and k[1] not in keep]:
+            actions.append({"_op_type": "delete", "_index": index, "_id": key[1]})
+            staged[key] = None
+        return actions, staged
+
+    def publish(self, es, docs_by_index, prune=False, **bulk_kwargs):
+        """
+        docs_by_index: {index: {doc_id: doc}}. Sends every change in one
+        bulk_index call and returns its BulkReport (with .skipped set).
+        """
+        actions, skipped, staged = [], 0, {}
+        for index, docs in docs_by_index.items():
+            index_actions, index_skipped, index_staged = self.plan(index, docs, prune)
+            actions += index_actions
+            skipped += index_skipped
+            staged.update(index_staged)
+        return self._send(es, actions, skipped, staged, bulk_kwargs)
+
+    def publish_stream(self, es, index, items, prune=False, chunk_docs=BULK_CHUNK_DOCS, **bulk_kwargs):
+        """
+        publish() for one index from an iterable of (doc_id, doc), read and
+        sent chunk_docs at a time so the documents are never all held at
+        once. prune: after the last chunk, delete previously published docs
+        of `index` whose ids did not appear. Returns one BulkReport.
+        """
+        t0 = time.perf_counter()
+        report = BulkReport()
+        seen = set()
+        chunk = {}
+        for doc_id, doc in items:
+            chunk[doc_id] = doc
+            if len(chunk) >= chunk_docs:
+                seen.update(chunk)
+                report.merge(self.publish(es, {index: chunk}, **bulk_kwargs))
+                chunk = {}
+        if chunk:
+            seen.update(chunk)
+            report.merge(self.publish(es, {index: chunk}, **bulk_kwargs))
+        if prune:
+            actions, staged = self._delete_actions(index, seen)
+            report.merge(self._send(es, actions, 0, staged, bulk_kwargs))
+        report.elapsed = time.perf_counter() - t0
+        return report
+
+    def _send(self, es, actions, skipped, staged, bulk_kwargs):
+        """Send planned actions and advance the published state on success."""
+        bulk_kwargs.setdefault("log", None)
+        report = bulk_index(es, actions, **bulk_kwargs) if actions else BulkReport()
+        report.skipped = skipped
+        for key, doc in staged.items():
+            if report.failed:
+                # Resend written docs in full next time; keep deleted ones so the delete is retried
+                if doc is not None:
+                    self.published.pop(key, None)
+            elif doc is None:
+                self.published.pop(key, None)
+            else:
+                self.published[key] = doc
+        return report
+
+    def forget(self, index=None):
+        """Drop the published state (for one index or all) so everything is re-sent."""
+        if index is None:
+            self.published.clear()
+        else:
+            self.published = {k: v for k, v in self.published.items() if k[0] != index}
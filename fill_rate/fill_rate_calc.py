@@ -1,25 +1,17 @@
-import requests
-import pandas as pd
+import os
+import sys
 import matplotlib.pyplot as plt
 from util import detect_long_term_trend_changes
 
-BASE_URL = "https://hackutd2025.eog.systems"
-
-# Fetch historical data
-data = requests.get(f"{BASE_URL}/api/Data?start_date=1762224474&end_date=1762231674").json()
+# Shared loader lives in the repo root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from data_loader import fetch_levels
 
-# Convert JSON to DataFrame
-rows = []
-for entry in data:
-    timestamp = entry["timestamp"]
-    for cid, level in entry["cauldron_levels"].items():
-        rows.append([timestamp, cid, level])
-
-df = pd.DataFrame(rows, columns=["timestamp", "cauldron_id", "level"])
-df['timestamp'] = pd.to_datetime(df['timestamp'], utc=True)
+BASE_URL = "https://hackutd2025.eog.systems"
 
-# Convert to UTC seconds (Unix time)
-df = df.sort_values(by=["timestamp"])
+# Fetch historical data (already sorted, UTC timestamps)
+levels = fetch_levels(start_date=1762224474, end_date=1762231674, base_url=BASE_URL)
+df = levels.to_long()
 
 # === Plot all cauldrons ===
 plt.figure(figsize=(12,6))
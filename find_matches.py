@@ -1,304 +1,197 @@
-import requests
+import argparse
+import numpy as np
 import pandas as pd
-from datetime import date, datetime
-import itertools
-import json
 from pathlib import Path
 
-# --- Import our custom analyzer tools from the other file ---
-from slope_analyzer import SlopeAnalyzer, get_negative_intervals_ending_on
+# --- Import our custom analyzer tools from the other files ---
+from anomaly_report import ReportWriter, export_nested
+from api_client import ApiClient
+from data_loader import fetch_levels
+from level_cache import load_levels
+from ticket_matcher import TicketIndex
+from reconcile import run_reconciliation
 
 # -----------------------------------------------------------
 # 1. SETUP: Define global settings
 # -----------------------------------------------------------
 BASE_URL = "https://hackutd2025.eog.systems"
 VOLUME_TOLERANCE = 5 # +/- 1.5 Liters
+MATCH_TIME_BUDGET = 2.0 # seconds of ticket matching allowed per cauldron/day
 #
-# --- START_DATE and END_DATE are now fetched in Section 2 ---
+# --- START_DATE and END_DATE are fetched in Section 2 ---
 #
 
+
 # -----------------------------------------------------------
 # 2. FETCH ALL COMMON DATA (Cauldrons, Tickets, Levels)
 # -----------------------------------------------------------
-print("Fetching all required data one time...")
-
-try:
-    # --- (CHANGED) Fetch Tickets API first to get the date range ---
-    tickets_response_json = requests.get(f"{BASE_URL}/api/Tickets").json()
-    all_tickets = tickets_response_json.get('transport_tickets', [])
-    
-    # --- (NEW) Extract start and end dates from metadata ---
-    date_range = tickets_response_json['metadata']['date_range']
-    # Split on 'T' to get just the date part (e.g., '2025-10-30')
-    START_DATE = date_range['start'].split('T')[0]
-    END_DATE = date_range['end'].split('T')[0]
-    
-    print(f"Date range set by Tickets API: {START_DATE} to {END_DATE}")
-    # --- (END OF NEW BLOCK) ---
-
-    cauldrons_response = requests.get(f"{BASE_URL}/api/Information/cauldrons").json()
-    all_cauldron_ids = [c['id'] for c in cauldrons_response]
-    
-    level_data = requests.get(f"{BASE_URL}/api/Data?start_date=0&end_date=1762645088").json()
-
-    rows = []
-    for entry in level_data:
-        timestamp = entry["timestamp"]
-        for cid, level in entry["cauldron_levels"].items():
-            rows.append([timestamp, cid, level])
-
-    df_all_levels = pd.DataFrame(rows, columns=["timestamp", "cauldron_id", "level"])
-    df_all_levels['timestamp'] = pd.to_datetime(df_all_levels['timestamp'])
-    df_all_levels = df_all_levels.sort_values(by="timestamp")
-    print(f"Fetched {len(all_cauldron_ids)} cauldrons, {len(all_tickets)} tickets, and {len(df_all_levels)} level readings.\n")
-
-except Exception as e:
-    print(f"CRITICAL ERROR during data fetching: {e}")
-    exit()
+def fetch_inputs(use_cache=True):
+    print("Fetching all required data one time...")
 
-# -----------------------------------------------------------
-# 3. INITIALIZE STORAGE FOR JSON OUTPUT
-# ... (This section is unchanged) ...
-# -----------------------------------------------------------
-all_anomalies = {}
-all_matches = {}
+    api = ApiClient(BASE_URL)
+    try:
+        # --- Fetch Tickets API first to get the date range ---
+        tickets_response_json = api.tickets()
+        all_tickets = tickets_response_json.get('transport_tickets', [])
 
-# -----------------------------------------------------------
-# 4. MAIN ANALYSIS LOOP
-# ... (This section is unchanged) ...
-# -----------------------------------------------------------
-try:
-    date_iterator = pd.date_range(start=START_DATE, end=END_DATE, freq='D')
-    print(f"Starting analysis for {len(date_iterator)} days ({START_DATE} to {END_DATE})\n")
-except ValueError as e:
-    print(f"Error with date range: {e}. Check START_DATE and END_DATE formats.")
-    exit()
+        # --- Extract start and end dates from metadata ---
+        date_range = tickets_response_json['metadata']['date_range']
+        # Split on 'T' to get just the date part (e.g., '2025-10-30')
+        start_date = date_range['start'].split('T')[0]
+        end_date = date_range['end'].split('T')[0]
 
-total_matches_found = 0
+        print(f"Date range set by Tickets API: {start_date} to {end_date}")
 
-# --- OUTER LOOP: Iterate over each date ---
-for current_date_dt in date_iterator:
-    current_date = current_date_dt.date()
-    date_str = current_date.strftime('%Y-%m-%d')
+        cauldrons_response = api.cauldrons()
+        all_cauldron_ids = [c['id'] for c in cauldrons_response]
 
-    print(f"==================================================")
-    print(f"          ANALYZING DATE: {date_str}          ")
-    print(f"==================================================\n")
+        if use_cache:
+            # Only the minutes missing from the local cache are downloaded
+            level_frame = load_levels(start_date=0, end_date=1762645088, base_url=BASE_URL, client=api)
+        else:
+            level_frame = fetch_levels(start_date=0, end_date=1762645088, base_url=BASE_URL, client=api)
+        n_readings = int(np.count_nonzero(~np.isnan(level_frame.levels)))
+        print(f"Fetched {len(all_cauldron_ids)} cauldrons, {len(all_tickets)} tickets, and {n_readings} level readings.\n")
 
-    # Initialize dictionaries for the current date
-    all_anomalies[date_str] = {}
-    all_matches[date_str] = {}
+    except Exception as e:
+        print(f"CRITICAL ERROR during data fetching: {e}")
+        exit()
 
-    # --- INNER LOOP: Iterate over each cauldron for this date ---
-    for cauldron_id in all_cauldron_ids:
+    return start_date, end_date, all_tickets, all_cauldron_ids, level_frame
 
-        # --- Step 4a: Find Drain Events (Anomalies & Matches) ---
-        df_cauldron = df_all_levels[df_all_levels["cauldron_id"] == cauldron_id]
 
-        if df_cauldron.empty:
-            continue
+# -----------------------------------------------------------
+# 3-4. RECONCILE DRAINS AGAINST TICKETS
+# Each cauldron is simplified once and then matched day by day
+# (see reconcile.py). With --workers N the cauldrons run on a
+# process pool; each cauldron's days are written to the report as
+# its result arrives, in cauldron order, so the output is identical
+# for any worker count.
+# -----------------------------------------------------------
+def analyze(start_date, end_date, all_tickets, all_cauldron_ids, level_frame, report, workers=1):
+    try:
+        date_iterator = pd.date_range(start=start_date, end=end_date, freq='D')
+        print(f"Starting analysis for {len(date_iterator)} days ({start_date} to {end_date})\n")
+    except ValueError as e:
+        print(f"Error with date range: {e}. Check START_DATE and END_DATE formats.")
+        exit()
 
-        # Run the analysis
-        an = SlopeAnalyzer(df_cauldron["timestamp"], df_cauldron["level"], epsilon=20)
-        all_inflection_points = an.inflection_points()
+    date_strs = [d.strftime('%Y-%m-%d') for d in date_iterator]
+    ticket_index = TicketIndex(all_tickets)
 
-        # Pass the growth rate, not the 'an' object
-        avg_growth_rate = an.average_positive_slope()
-        drain_events = get_negative_intervals_ending_on(
-            all_inflection_points,
-            current_date,
-            avg_growth_rate
-        )
+    for date_str in date_strs:
+        report.start_date(date_str)
 
-        # --- Step 4b: Find Relevant Tickets ---
-        relevant_tickets = []
-        for ticket in all_tickets:
-            if ticket['cauldron_id'] == cauldron_id and ticket['date'] == date_str:
-                relevant_tickets.append(ticket)
-
-        # --- Step 4c: Skip if no activity ---
-        if not drain_events and not relevant_tickets:
-            continue
-
-        # --- Step 4d: Match Events to Tickets ---
-        print(f"--- Analyzing: {cauldron_id} ---")
-        print(f"Found {len(drain_events)} drain event(s) and {len(relevant_tickets)} ticket(s).")
-
-        unmatched_tickets = list(relevant_tickets) # Full list of tickets to be matched
-        unmatched_drains = [] # Drains left over after Phase 1
-        cauldron_match_count = 0
-
-        # Initialize storage for this specific cauldron
-        cauldron_anomalies = []
-        cauldron_matches = []
-
-        print("\n  Phase 1: Attempting 1-to-1 matching...")
-
-        # --- PHASE 1: 1-to-1 Matching ---
-        for event in drain_events:
-            event_volume = event['drain_volume']
-            found_match = False
-
-            # --- Attempt 1-to-1 Match ---
-            for ticket in unmatched_tickets:
-                ticket_volume = ticket['amount_collected']
-
-                if abs(event_volume - ticket_volume) <= VOLUME_TOLERANCE:
-                    print("  ✅ [Phase 1] MATCH FOUND (1-to-1)")
-
-                    # Store the Match
-                    cauldron_matches.append({
-                        "type": "1-to-1",
-                        "drain_volume": event_volume,
-                        "drain_end_time": event['end_point'][0].strftime('%Y-%m-%d %H:%M:%S'),
-                        "ticket_ids": [ticket['ticket_id']],
-                        "ticket_sum": ticket_volume,
-                        "cauldron_id": cauldron_id,
-                        "date": date_str
-                    })
-
-                    unmatched_tickets.remove(ticket)
-                    found_match = True
-                    cauldron_match_count += 1
-                    break
-
-            if not found_match:
-                unmatched_drains.append(event) # Add to list for Phase 2
-
-        print(f"  Phase 1 Complete: {cauldron_match_count} match(es) found.")
-
-        # --- PHASE 2: Many-to-One (Sum) Matching ---
-        final_unmatched_drains = [] # Drains left over after Phase 2
-
-        if unmatched_drains and unmatched_tickets:
-            print("\n  Phase 2: Attempting to match remaining drains by summing tickets...")
-
-            # Sort drains largest-first to match big ones first
-            for event in sorted(unmatched_drains, key=lambda x: x['drain_volume'], reverse=True):
-                event_volume = event['drain_volume']
-                found_combo_match = False
-
-                # Try combinations from 2 tickets up to all remaining tickets
-                for r in range(2, len(unmatched_tickets) + 1):
-                    for combo in itertools.combinations(unmatched_tickets, r):
-                        combo_sum = sum(ticket['amount_collected'] for ticket in combo)
-
-                        if abs(event_volume - combo_sum) <= VOLUME_TOLERANCE:
-                            print("  ✅ [Phase 2] MATCH FOUND (Sum of tickets)")
-
-                            tickets_in_combo = []
-                            ticket_ids_in_combo = []
-                            for ticket in combo:
-                                tickets_in_combo.append(ticket)
-                                ticket_ids_in_combo.append(ticket['ticket_id'])
-
-                            # Store the Match (Many-to-One)
-                            cauldron_matches.append({
-                                "type": "Many-to-One",
-                                "drain_volume": event_volume,
-                                "drain_end_time": event['end_point'][0].strftime('%Y-%m-%d %H:%M:%S'),
-                                "ticket_ids": ticket_ids_in_combo,
-                                "ticket_sum": combo_sum,
-                                "cauldron_id": cauldron_id,
-                                "date": date_str
-                            })
-
-                            # Rebuild the unmatched_tickets list, removing the ones we used
-                            unmatched_tickets = [t for t in unmatched_tickets if t not in tickets_in_combo]
-
-                            found_combo_match = True
-                            cauldron_match_count += 1
-                            break # Stop checking combos
-                    if found_combo_match:
-                        break # Stop checking combo sizes (e.g., stop checking r=3 if r=2 worked)
-
-                if not found_combo_match:
-                    final_unmatched_drains.append(event) # This drain is truly unmatched
-        else:
-            final_unmatched_drains = list(unmatched_drains) # No tickets left, all drains are unmatched
+    totals = {"matches": 0, "approximate": 0}
 
-        # --- 4e: Store Anomalies (Unmatched Drains and Tickets) ---
+    # --- OUTER LOOP: each cauldron's result, as soon as it is ready ---
+    for cauldron_id, days in run_reconciliation(
+        level_frame,
+        all_cauldron_ids,
+        ticket_index,
+        date_strs,
+        VOLUME_TOLERANCE,
+        MATCH_TIME_BUDGET,
+        workers=workers
+    ):
+        print(f"==================================================")
+        print(f"          ANALYZING CAULDRON: {cauldron_id}          ")
+        print(f"==================================================\n")
 
-        # 1. Unmatched Drains (Drain Anomalies)
-        if final_unmatched_drains:
-            print("\n  ❌ Unmatched Drain Events (Drain Anomalies):")
-            for event in final_unmatched_drains:
-                print(f"    - Drain Event, Volume: {event['drain_volume']:.2f} L (Ended: {event['end_point'][0]})")
-                cauldron_anomalies.append({
-                    "volume": event['drain_volume'],
-                    "time": event['end_point'][0].strftime('%Y-%m-%d %H:%M:%S'),
-                    "type": "DRAIN_ANOMALY"
-                })
+        # --- INNER LOOP: stream its days to the report ---
+        for date_str in date_strs:
+            day = days.get(date_str)
+            if day is None:
+                continue
 
-        # 2. Unmatched Tickets (Ticket Anomalies)
-        if unmatched_tickets:
-            print("\n  ⚠️ Unmatched Tickets (Ticket Anomalies):")
-            for ticket in unmatched_tickets:
-                print(f"    - Ticket ID: {ticket['ticket_id']}, Volume: {ticket['amount_collected']:.2f} L")
-                cauldron_anomalies.append({
-                    "volume": ticket['amount_collected'],
-                    "ticket_id": ticket['ticket_id'],
-                    "type": "TICKET_ANOMALY"
-                })
+            print(f"[{date_str}]")
+            print("\n".join(day["log"]))
 
-        # --- FINAL STORAGE for this Cauldron/Date ---
-        if cauldron_anomalies:
-            all_anomalies[date_str][cauldron_id] = cauldron_anomalies
+            report.write_day(date_str, cauldron_id, day["anomalies"], day["matches"])
 
-        if cauldron_matches:
-            all_matches[date_str][cauldron_id] = cauldron_matches
+            ticket_index.mark_matched(day["matched_ticket_ids"])
+            totals["matches"] += len(day["matches"])
+            totals["approximate"] += day["approximate"]
 
-        if cauldron_match_count > 0:
-             print(f"\n  Summary: {cauldron_match_count} total match(es) found for {cauldron_id} on this day.")
+        print(f"\n...Finished analysis for {cauldron_id}\n")
 
-        print("--------------------------------" + "-"*len(cauldron_id))
-        total_matches_found += cauldron_match_count
-
-    print(f"\n...Finished analysis for {date_str}\n")
+    return ticket_index, totals
 
 
 # -----------------------------------------------------------
-# 5. SAVE RESULTS TO JSON
-# ... (This section is unchanged, still saves to React public/ folder) ...
+# 5. SAVE RESULTS
+# The report is streamed to anomalies.ndjson while analyze() runs
+# (see anomaly_report.py); the nested anomalies.json for the React
+# dashboard is exported from it at the end.
 # -----------------------------------------------------------
-try:
-    REACT_APP_FOLDER_NAME = 'cauldron-dashboard'
-    
-    SCRIPT_DIR = Path(__file__)
-    PUBLIC_DIR = SCRIPT_DIR.parent / REACT_APP_FOLDER_NAME / 'public'
-    
-    if not PUBLIC_DIR.is_dir():
-        print(f"Warning: Directory not found: {PUBLIC_DIR}")
-        print("Saving 'anomalies.json' to the local script directory instead.")
-        OUTPUT_FILE_PATH = 'anomalies.json'
-    else:
-        OUTPUT_FILE_PATH = PUBLIC_DIR / 'anomalies.json'
-        print(f"Output path set to: {OUTPUT_FILE_PATH}")
-
-except Exception as e:
-    print(f"Warning: Error creating path ({e}). Saving to local directory instead.")
-    OUTPUT_FILE_PATH = 'anomalies.json'
-
-
-final_output = {
-    "anomalies": all_anomalies,
-    "matches": all_matches,
-    "metadata": {
-        "start_date": START_DATE,
-        "end_date": END_DATE,
-        "volume_tolerance": VOLUME_TOLERANCE
+def output_dir():
+    try:
+        REACT_APP_FOLDER_NAME = 'cauldron-dashboard'
+
+        SCRIPT_DIR = Path(__file__)
+        PUBLIC_DIR = SCRIPT_DIR.parent / REACT_APP_FOLDER_NAME / 'public'
+
+        if not PUBLIC_DIR.is_dir():
+            print(f"Warning: Directory not found: {PUBLIC_DIR}")
+            print("Saving reports to the local script directory instead.")
+            return Path('.')
+        print(f"Output directory set to: {PUBLIC_DIR}")
+        return PUBLIC_DIR
+
+    except Exception as e:
+        print(f"Warning: Error creating path ({e}). Saving to local directory instead.")
+        return Path('.')
+
+
+def save_results(start_date, end_date, report, ticket_index, totals, nested_json=True):
+    metadata = {
+        "start_date": start_date,
+        "end_date": end_date,
+        "volume_tolerance": VOLUME_TOLERANCE,
+        "approximate_matches": totals["approximate"]
     }
-}
-
-try:
-    with open(OUTPUT_FILE_PATH, 'w') as f:
-        json.dump(final_output, f, indent=4)
-    print(f"\nResults successfully saved to {OUTPUT_FILE_PATH}")
-except Exception as e:
-    print(f"CRITICAL ERROR saving JSON file: {e}")
-
-print(f"==================================================")
-print(f"          ANALYSIS COMPLETE          ")
-print(f"Total matches found across all cauldrons")
-print(f"from {START_DATE} to {END_DATE}: {total_matches_found}")
-print(f"==================================================")
\ No newline at end of file
+
+    try:
+        report.close(metadata)
+        print(f"\nReport ({report.records} records) saved to {report.path}")
+        if nested_json:
+            json_path = Path(report.path).with_suffix('.json')
+            export_nested(report.path, json_path)
+            print(f"Results successfully saved to {json_path}")
+    except Exception as e:
+        print(f"CRITICAL ERROR saving report: {e}")
+
+    print(f"==================================================")
+    print(f"          ANALYSIS COMPLETE          ")
+    print(f"Total matches found across all cauldrons")
+    print(f"from {start_date} to {end_date}: {totals['matches']}")
+    print(f"Tickets matched: {len(ticket_index.matched_ids)} of {len(ticket_index)}")
+    if totals["approximate"]:
+        print(f"({totals['approximate']} of them only matched approximately)")
+    print(f"==================================================")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconcile cauldron drain events against transport tickets.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processes to spread cauldrons across (default: 1, no pool)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="download the full level history instead of syncing the local cache")
+    parser.add_argument("--no-nested-json", action="store_true",
+                        help="only write anomalies.ndjson, skip the nested anomalies.json dashboard export")
+    args = parser.parse_args()
+
+    start_date, end_date, all_tickets, all_cauldron_ids, level_frame = fetch_inputs(use_cache=not args.no_cache)
+    report = ReportWriter(output_dir() / 'anomalies.ndjson')
+    try:
+        ticket_index, totals = analyze(
+            start_date, end_date, all_tickets, all_cauldron_ids, level_frame, report, workers=args.workers
+        )
+    except BaseException:
+        report.abort()
+        raise
+    save_results(start_date, end_date, report, ticket_index, totals, nested_json=not args.no_nested_json)
+
+
+if __name__ == "__main__":
+    main()
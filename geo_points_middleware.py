@@ -1,7 +1,10 @@
 from elasticsearch import Elasticsearch
-import requests
+import asyncio
 import time
-from datetime import datetime, timezone
+from api_client import NETWORK_PATH, AsyncApiClient, TopologyCache
+from es_bulk import DiffPublisher, bulk_index
+from level_cache import LevelCache
+from topology import Topology
 
 # === CONFIGURATION ===
 ELASTIC_HOST = "localhost"
@@ -11,12 +14,16 @@ MARKET_INDEX = "geo_point_market_index"  # Market index
 EDGE_INDEX = "geo_edges_index"      # Edge index
 API_BASE = "https://hackutd2025.eog.systems"
 API_URL_DATA = "https://hackutd2025.eog.systems/api/Data" 
+LEVEL_DEADBAND = 0.5                # litres; smaller level changes are not re-published (0 = publish all)
 es = Elasticsearch([f"http://{ELASTIC_HOST}:{ELASTIC_PORT}"], http_auth=('elastic', 'nf4caJQE'))
 
-
-def build_data_url():
-    current_unix = int(time.time())
-    return f"{API_URL_DATA}?start_date=0&end_date={current_unix}"
+# One pooled, retrying client for every request this script makes (see api_client.py)
+api = AsyncApiClient(base_url=API_BASE)
+level_cache = LevelCache(base_url=API_BASE, client=api.client)
+# Cauldrons/market/couriers/network rarely change: TTL + ETag cache, payloads hashed
+topology_cache = TopologyCache()
+# Last published node docs; each tick only changed fields go out as partial updates
+publisher = DiffPublisher(deadbands={"value": LEVEL_DEADBAND})
 
 # Create index with geo_point mapping for nodes
 def create_geo_index(index_name):
@@ -59,55 +66,55 @@ create_geo_index(ELASTIC_INDEX)
 create_geo_index(MARKET_INDEX)
 create_edge_index(EDGE_INDEX)
 
+# Write edge changes between two Topology snapshots; True if nothing failed
+def push_edges(snapshot, previous):
+    upserts, deletes = snapshot.diff_edges(previous)
+    actions = [{"_index": EDGE_INDEX, "_id": eid, "_source": doc} for eid, doc in upserts.items()]
+    actions += [{"_op_type": "delete", "_index": EDGE_INDEX, "_id": eid} for eid in deletes]
+    report = bulk_index(es, actions, log=None)
+    if previous is None:
+        # First snapshot of this run: drop edges indexed without ids by older
+        # versions of this script, and any edge no longer in the network
+        es.delete_by_query(index=EDGE_INDEX, body={
+            "query": {"bool": {"must_not": {"ids": {"values": list(snapshot.edge_docs())}}}}
+        })
+    print(f"Edges: {len(upserts)} upserted, {len(deletes)} deleted ({report.summary()}) "
+          f"at {time.strftime('%Y-%m-%d %H:%M:%S')}")
+    for error in report.errors:
+        print(f"  Failed: {error}")
+    return report.failed == 0
+
 # Fetch and index geo points from cauldrons, market, couriers
 def fetch_and_push_geo_points():
+    indexed_topology = None     # last Topology whose edges are fully in EDGE_INDEX
     while True:
         try:
-            url_data = build_data_url()
-            data_response = requests.get(url_data)
-            data_response.raise_for_status()
-            data_col = data_response.json()
-
-            # Sort data_col (list of dicts) by 'timestamp'
-            if isinstance(data_col, list):
-                def _ts_sort_key(item):
-                    ts = item.get("timestamp")
-                    if isinstance(ts, str):
-                        t = ts.replace('Z', '+00:00') if ts.endswith('Z') else ts
-                        try:
-                            dt = datetime.fromisoformat(t)
-                            if dt.tzinfo is None:
-                                dt = dt.replace(tzinfo=timezone.cst)
-                            return (0, dt)
-                        except Exception:
-                            # Fallback to string compare
-                            return (1, ts)
-                    # Handle non-string or missing timestamps last
-                    return (2, str(ts) if ts is not None else '')
-
-                data_col.sort(key=_ts_sort_key)
-
-
-            
-            # Cauldrons
-            cauldron_resp = requests.get(f"{API_BASE}/api/Information/cauldrons")
-            cauldrons = cauldron_resp.json()
-        
-
+            # Latest levels from the local cache; only minutes not cached yet are downloaded
+            level_cache.sync(end_date=int(time.time()))
+            latest_ts, latest_levels = level_cache.latest()
+
+            # Cauldrons, market, couriers and network are independent: fetch them concurrently.
+            # Inside the TTL they come from topology_cache without any request.
+            topology = asyncio.run(api.cached_topology(topology_cache))
+            topology_changed = any(entry.changed for entry in topology.values())
+
+            # Node docs are rebuilt every tick; the publisher only sends what changed
+            # since the last tick (usually just some cauldron "value" fields)
+            cauldrons = topology["cauldrons"].value
+            market = topology["market"].value
+            node_docs = {}
+            market_docs = {}
             for c in cauldrons:
-                print("asjhdajs", data_col[-1]['timestamp'], data_col[-1]['cauldron_levels'][c.get("id")])
                 if "latitude" in c and "longitude" in c:
                     doc = {
                         "geo": {"lat": c["latitude"], "lon": c["longitude"]},
                         "name": c.get("name", c.get("id", "cauldron")),
                         "type": "cauldron",
                         "id": c.get("id"),
-                        "value": data_col[-1]['cauldron_levels'][c.get("id")]
+                        "value": latest_levels.get(c.get("id"))
                     }
-                    es.index(index=ELASTIC_INDEX, id=f"cauldron_{doc['id']}", document=doc)
+                    node_docs[f"cauldron_{doc['id']}"] = doc
             # Market
-            market_resp = requests.get(f"{API_BASE}/api/Information/market")
-            market = market_resp.json()
             if "latitude" in market and "longitude" in market:
                 doc = {
                     "geo": {"lat": market["latitude"], "lon": market["longitude"]},
@@ -115,11 +122,9 @@ def fetch_and_push_geo_points():
                     "type": "market",
                     "id": market.get("id")
                 }
-                es.index(index=MARKET_INDEX, id=f"market_{doc['id']}", document=doc)
+                market_docs[f"market_{doc['id']}"] = doc
             # Couriers (no geo, but can add if available)
-            courier_resp = requests.get(f"{API_BASE}/api/Information/couriers")
-            couriers = courier_resp.json()
-            for courier in couriers:
+            for courier in topology["couriers"].value:
                 if "latitude" in courier and "longitude" in courier:
                     doc = {
                         "geo": {"lat": courier["latitude"], "lon": courier["longitude"]},
@@ -127,47 +132,31 @@ def fetch_and_push_geo_points():
                         "type": "courier",
                         "id": courier.get("courier_id")
                     }
-                    es.index(index=ELASTIC_INDEX, id=f"courier_{doc['id']}", document=doc)
-            print(f"Geo points indexed at {time.strftime('%Y-%m-%d %H:%M:%S')}")
-
-            
-            # Build node lookup for geo coordinates
-            node_lookup = {}
-            res = es.search(index=ELASTIC_INDEX, body={"query": {"match_all": {}}}, size=1000)
-            for doc in res["hits"]["hits"]:
-                node_lookup[doc["_source"]["id"]] = doc["_source"]["geo"]
-            
-            # Also include market node
-            market_res = es.search(index=MARKET_INDEX, body={"query": {"match_all": {}}}, size=1000)
-            for doc in market_res["hits"]["hits"]:
-                node_lookup[doc["_source"]["id"]] = doc["_source"]["geo"]
-
-            # Fetch and index edges
-            network_resp = requests.get(f"{API_BASE}/api/Information/network")
-            network = network_resp.json()
-            edges = network.get("edges", [])
-            for edge in edges:
-                from_id = edge.get("from")
-                to_id = edge.get("to")
-                from_geo = node_lookup.get(from_id)
-                to_geo = node_lookup.get(to_id)
-                if from_geo and to_geo:
-                    edge_doc = {
-                        "from": from_id,
-                        "to": to_id,
-                        "travel_time_minutes": edge.get("travel_time_minutes"),
-                        "line": {
-                            "type": "linestring",
-                            "coordinates": [
-                                [from_geo["lon"], from_geo["lat"]],
-                                [to_geo["lon"], to_geo["lat"]]
-                            ]
-                        }
-                    }
-                    es.index(index=EDGE_INDEX, document=edge_doc)
-            print(f"Edges indexed at {time.strftime('%Y-%m-%d %H:%M:%S')}")
+                    node_docs[f"courier_{doc['id']}"] = doc
+            report = publisher.publish(es, {ELASTIC_INDEX: node_docs, MARKET_INDEX: market_docs})
+            print(f"Geo points (levels at {latest_ts}): {report.summary()} "
+                  f"at {time.strftime('%Y-%m-%d %H:%M:%S')}")
+            for error in report.errors:
+                print(f"  Failed: {error}")
+
+            # Edges only change with the topology: diff against the last indexed
+            # snapshot and write just the added/changed/removed ones
+            if topology_changed:
+                snapshot = Topology.from_api(cauldrons, market, topology["couriers"].value,
+                                             topology["network"].value)
+                if push_edges(snapshot, indexed_topology):
+                    indexed_topology = snapshot
+                else:
+                    topology_cache.invalidate(NETWORK_PATH)     # retry the diff next tick
+            else:
+                print(f"Topology unchanged, edges skipped ({topology_cache.summary()})")
+            for line in api.metrics.summary():
+                print(f"  API {line}")
         except Exception as e:
             print(f"Error: {e}")
+            # Whatever was fetched may not have been indexed: treat it as new next tick
+            topology_cache.invalidate()
+            publisher.forget()
         time.sleep(60)
 
 if __name__ == "__main__":
@@ -0,0 +1,161 @@
+"""
+Local on-disk cache of the /api/Data level history.
+
+Layout (one directory, default ./.level_cache):
+    meta.json          -> {"cauldron_ids": [...], "rows": N, "last_timestamp": ts}
+    times.i64          -> N int64 epoch seconds, ascending
+    <cauldron_id>.f64  -> N float64 levels, NaN where the cauldron had no reading
+
+Every column is a flat binary file, so reads are np.memmap slices and a sync
+only appends the rows newer than last_timestamp. A cold run pulls the full
+history once; warm runs only download the last few minutes.
+
+meta.json is written last (atomically), so a crash mid-append leaves extra
+bytes at the end of some files; they are truncated the next time the cache
+is opened.
+"""
+import json
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+
+from data_loader import BASE_URL, LevelFrame, parse_levels
+
+DEFAULT_CACHE_DIR = Path(__file__).resolve().parent / ".level_cache"
+
+_TIMES_FILE = "times.i64"
+_META_FILE = "meta.json"
+
+
+class LevelCache:
+    def __init__(self, path=DEFAULT_CACHE_DIR, base_url=BASE_URL, client=None):
+        self.path = Path(path)
+        self.base_url = base_url
+        self.client = client        # api_client.ApiClient, created on first sync
+        self.path.mkdir(parents=True, exist_ok=True)
+
+        meta_path = self.path / _META_FILE
+        if meta_path.exists():
+            meta = json.loads(meta_path.read_text())
+        else:
+            meta = {"cauldron_ids": [], "rows": 0, "last_timestamp": None}
+        self.cauldron_ids = meta["cauldron_ids"]
+        self.rows = meta["rows"]
+        self.last_timestamp = meta["last_timestamp"]
+        self._truncate_to_rows()
+
+    # ---------- files ----------
+    def _column_path(self, cauldron_id):
+        return self.path / f"{cauldron_id}.f64"
+
+    def _truncate_to_rows(self):
+        """Drop bytes past `rows` left behind by an interrupted append."""
+        files = [(self.path / _TIMES_FILE, 8)] + [(self._column_path(c), 8) for c in self.cauldron_ids]
+        for file_path, itemsize in files:
+            if file_path.exists() and file_path.stat().st_size > self.rows * itemsize:
+                with open(file_path, "r+b") as f:
+                    f.truncate(self.rows * itemsize)
+
+    def _write_meta(self):
+        tmp = self.path / (_META_FILE + ".tmp")
+        tmp.write_text(json.dumps({
+            "cauldron_ids": self.cauldron_ids,
+            "rows": self.rows,
+            "last_timestamp": self.last_timestamp,
+        }))
+        os.replace(tmp, self.path / _META_FILE)
+
+    def _memmap(self, file_path, dtype):
+        if self.rows == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(file_path, dtype=dtype, mode="r", shape=(self.rows,))
+
+    # ---------- writing ----------
+    def append(self, frame):
+        """
+        Append the rows of a LevelFrame that are newer than the cache.
+        Older or duplicate timestamps are ignored, so overlapping fetches are
+        safe. Returns the number of rows added.
+        """
+        rows = np.arange(len(frame))
+        if self.last_timestamp is not None:
+            rows = rows[frame.times > self.last_timestamp]
+        if len(rows) == 0:
+            return 0
+
+        # Same minute reported twice in one payload: keep the last reading
+        t = frame.times[rows]
+        rows = rows[np.append(t[1:] != t[:-1], True)]
+        times = frame.times[rows]
+
+        for cid in frame.cauldron_ids:
+            if cid not in self.cauldron_ids:
+                # New cauldron: back-fill its column with NaN for existing rows
+                np.full(self.rows, np.nan).tofile(self._column_path(cid))
+                self.cauldron_ids.append(cid)
+
+        for cid in self.cauldron_ids:
+            col = frame.column(cid)[rows] if cid in frame else np.full(len(rows), np.nan)
+            with open(self._column_path(cid), "ab") as f:
+                np.ascontiguousarray(col, dtype=np.float64).tofile(f)
+        with open(self.path / _TIMES_FILE, "ab") as f:
+            np.ascontiguousarray(times, dtype=np.int64).tofile(f)
+
+        self.rows += len(times)
+        self.last_timestamp = int(times[-1])
+        self._write_meta()
+        return len(times)
+
+    def sync(self, end_date=None):
+        """
+        Fetch only [last_timestamp, end_date] from /api/Data and append it.
+        Returns the number of new rows.
+        """
+        if end_date is None:
+            end_date = int(time.time())
+        start_date = self.last_timestamp if self.last_timestamp is not None else 0
+        if start_date > end_date:
+            return 0
+        if self.client is None:
+            from api_client import ApiClient
+            self.client = ApiClient(self.base_url)
+        return self.append(parse_levels(self.client.data(start_date, end_date)))
+
+    # ---------- reading ----------
+    def times(self):
+        return self._memmap(self.path / _TIMES_FILE, np.int64)
+
+    def column(self, cauldron_id):
+        """Memory-mapped level column for one cauldron."""
+        return self._memmap(self._column_path(cauldron_id), np.float64)
+
+    def load(self, start_date=None, end_date=None):
+        """Rows with start_date <= time <= end_date (epoch seconds) as a LevelFrame."""
+        times = self.times()
+        lo = 0 if start_date is None else int(np.searchsorted(times, start_date, side="left"))
+        hi = len(times) if end_date is None else int(np.searchsorted(times, end_date, side="right"))
+        levels = np.empty((hi - lo, len(self.cauldron_ids)))
+        for i, cid in enumerate(self.cauldron_ids):
+            levels[:, i] = self.column(cid)[lo:hi]
+        return LevelFrame(np.array(times[lo:hi]), self.cauldron_ids, levels)
+
+    def latest(self):
+        """(timestamp, {cauldron_id: level}) of the newest cached reading, or (None, {})."""
+        if self.rows == 0:
+            return None, {}
+        levels = {cid: float(self.column(cid)[-1]) for cid in self.cauldron_ids}
+        return int(self.times()[-1]), {cid: v for cid, v in levels.items() if not np.isnan(v)}
+
+
+def load_levels(start_date=0, end_date=None, cache_dir=DEFAULT_CACHE_DIR, base_url=BASE_URL, sync=True,
+                client=None):
+    """
+    Cached replacement for data_loader.fetch_levels: sync the local cache up
+    to end_date (downloading only what is missing) and return the slice.
+    """
+    cache = LevelCache(cache_dir, base_url=base_url, client=client)
+    if sync:
+        cache.sync(end_date=end_date)
+    return cache.load(start_date, end_date)
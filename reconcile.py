@@ -0,0 +1,208 @@
+"""
+Per-cauldron reconciliation of drain events against transport tickets.
+
+A cauldron's drain detection and ticket matching never look at another
+cauldron, so find_matches can spread cauldrons over a process pool. The
+level history is written once to memory-mapped .npy files that every worker
+maps read-only, so the arrays are never pickled per task. Results are
+yielded one cauldron at a time, in cauldron order, so the caller can write
+each one out as it arrives and the output is the same for any number of
+workers.
+"""
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+import numpy as np
+
+from slope_analyzer import SlopeAnalyzer, split_by_day
+from ticket_matcher import match_drains_to_tickets
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def reconcile_cauldron(cauldron_id, times, levels, tickets_by_date, date_strs, tolerance, time_budget):
+    """
+    Detect drains for one cauldron and match them to that cauldron's tickets.
+
+    times: int64 epoch seconds; levels: matching float array (NaN = missing)
+    tickets_by_date: {date_str: [ticket, ...]} for this cauldron only
+    date_strs: 'YYYY-MM-DD' dates to reconcile
+
+    Returns {date_str: day_result} for dates with any drains or tickets, where
+    day_result has "anomalies", "matches", "matched_ticket_ids",
+    "approximate" (count) and "log" (console lines, printed by the caller).
+    """
+    has_level = ~np.isnan(levels)
+    if not has_level.any():
+        return {}
+
+    an = SlopeAnalyzer(np.asarray(times)[has_level], np.asarray(levels)[has_level], epsilon=20)
+    # All drains at once as a structured array (volumes include the learned inflow), sliced per UTC day
+    drains_by_day = split_by_day(an.drains())
+
+    results = {}
+    for date_str in date_strs:
+        day_drains = drains_by_day.get(date.fromisoformat(date_str).toordinal() - _EPOCH_ORDINAL)
+        drain_events = _drain_events(day_drains) if day_drains is not None else []
+        relevant_tickets = tickets_by_date.get(date_str, [])
+        if not drain_events and not relevant_tickets:
+            continue
+        results[date_str] = _reconcile_day(cauldron_id, date_str, drain_events, relevant_tickets,
+                                           tolerance, time_budget)
+    return results
+
+
+def _drain_events(drains):
+    """Event dicts (interval, end_point, duration, drain_volume) for the matcher and the log."""
+    import pandas as pd
+
+    events = []
+    for start_time, end_time, end_level, volume in zip(
+            drains["start_time"].tolist(), drains["end_time"].tolist(),
+            drains["end_level"].tolist(), drains["volume"].tolist()):
+        start = pd.Timestamp(start_time, unit="s", tz="UTC")
+        end = pd.Timestamp(end_time, unit="s", tz="UTC")
+        events.append({
+            "interval": (start, end),
+            "end_point": (end, end_level),
+            "duration": end - start,
+            "drain_volume": volume,
+        })
+    return events
+
+
+def _reconcile_day(cauldron_id, date_str, drain_events, relevant_tickets, tolerance, time_budget):
+    log = [
+        f"--- Analyzing: {cauldron_id} ---",
+        f"Found {len(drain_events)} drain event(s) and {len(relevant_tickets)} ticket(s).",
+    ]
+    cauldron_anomalies = []
+    cauldron_matches = []
+    matched_ticket_ids = []
+
+    # --- PHASE 1 (1-to-1) + PHASE 2 (sum of tickets), bounded in time ---
+    result = match_drains_to_tickets(drain_events, relevant_tickets, tolerance, time_budget=time_budget)
+
+    for event, tickets, approximate in result.matches:
+        matched_ticket_ids.extend(ticket['ticket_id'] for ticket in tickets)
+        ticket_sum = sum(ticket['amount_collected'] for ticket in tickets)
+        is_one_to_one = len(tickets) == 1
+        if is_one_to_one:
+            log.append("  ✅ [Phase 1] MATCH FOUND (1-to-1)")
+        else:
+            log.append("  ✅ [Phase 2] MATCH FOUND (Sum of tickets)")
+
+        cauldron_matches.append({
+            "type": "1-to-1" if is_one_to_one else "Many-to-One",
+            "drain_volume": event['drain_volume'],
+            "drain_end_time": event['end_point'][0].strftime('%Y-%m-%d %H:%M:%S'),
+            "ticket_ids": [ticket['ticket_id'] for ticket in tickets],
+            "ticket_sum": ticket_sum,
+            "cauldron_id": cauldron_id,
+            "date": date_str,
+            "approximate": approximate
+        })
+
+    if result.approximate_matches:
+        log.append(f"\n  ≈ {len(result.approximate_matches)} match(es) only fit on the discretized volume grid:")
+        for event, tickets, _ in result.approximate_matches:
+            ticket_sum = sum(ticket['amount_collected'] for ticket in tickets)
+            log.append(f"    - Drain {event['drain_volume']:.2f} L vs tickets {ticket_sum:.2f} L")
+
+    if result.budget_exhausted:
+        log.append(f"\n  ⏱ Matching time budget ({time_budget}s) exhausted; remaining drains left unmatched.")
+
+    # 1. Unmatched Drains (Drain Anomalies)
+    if result.unmatched_drains:
+        log.append("\n  ❌ Unmatched Drain Events (Drain Anomalies):")
+        for event in result.unmatched_drains:
+            log.append(f"    - Drain Event, Volume: {event['drain_volume']:.2f} L (Ended: {event['end_point'][0]})")
+            cauldron_anomalies.append({
+                "volume": event['drain_volume'],
+                "time": event['end_point'][0].strftime('%Y-%m-%d %H:%M:%S'),
+                "type": "DRAIN_ANOMALY"
+            })
+
+    # 2. Unmatched Tickets (Ticket Anomalies)
+    if result.unmatched_tickets:
+        log.append("\n  ⚠️ Unmatched Tickets (Ticket Anomalies):")
+        for ticket in result.unmatched_tickets:
+            log.append(f"    - Ticket ID: {ticket['ticket_id']}, Volume: {ticket['amount_collected']:.2f} L")
+            cauldron_anomalies.append({
+                "volume": ticket['amount_collected'],
+                "ticket_id": ticket['ticket_id'],
+                "type": "TICKET_ANOMALY"
+            })
+
+    if cauldron_matches:
+        log.append(f"\n  Summary: {len(cauldron_matches)} total match(es) found for {cauldron_id} on this day.")
+    log.append("--------------------------------" + "-" * len(cauldron_id))
+
+    return {
+        "anomalies": cauldron_anomalies,
+        "matches": cauldron_matches,
+        "matched_ticket_ids": matched_ticket_ids,
+        "approximate": len(result.approximate_matches),
+        "log": log,
+    }
+
+
+# -----------------------------------------------------------
+# Process-pool mode
+# -----------------------------------------------------------
+_worker_arrays = {}
+
+
+def _init_worker(times_path, levels_path, cauldron_ids):
+    """Map the shared level arrays once per worker process."""
+    _worker_arrays["times"] = np.load(times_path, mmap_mode="r")
+    _worker_arrays["levels"] = np.load(levels_path, mmap_mode="r")
+    _worker_arrays["col"] = {cid: i for i, cid in enumerate(cauldron_ids)}
+
+
+def _reconcile_mapped(args):
+    cauldron_id, tickets_by_date, date_strs, tolerance, time_budget = args
+    levels = _worker_arrays["levels"][:, _worker_arrays["col"][cauldron_id]]
+    return reconcile_cauldron(cauldron_id, _worker_arrays["times"], levels, tickets_by_date,
+                              date_strs, tolerance, time_budget)
+
+
+def run_reconciliation(level_frame, cauldron_ids, ticket_index, date_strs, tolerance, time_budget, workers=1):
+    """
+    Reconcile every cauldron in `cauldron_ids` over `date_strs`.
+
+    Yields (cauldron_id, {date_str: day_result}) in cauldron order as each
+    cauldron finishes, so only the results not yet consumed are held. With
+    workers > 1 the cauldrons run on a process pool that maps the level
+    history from disk instead of receiving it pickled.
+    """
+    cauldron_ids = [cid for cid in cauldron_ids if cid in level_frame]
+    jobs = (
+        (cid, {d: ticket_index.tickets_for(cid, d) for d in date_strs}, date_strs, tolerance, time_budget)
+        for cid in cauldron_ids
+    )
+
+    if workers <= 1 or len(cauldron_ids) <= 1:
+        for job in jobs:
+            yield job[0], reconcile_cauldron(job[0], level_frame.times, level_frame.column(job[0]), *job[1:])
+        return
+
+    tmp_dir = tempfile.mkdtemp(prefix="reconcile_")
+    try:
+        times_path = os.path.join(tmp_dir, "times.npy")
+        levels_path = os.path.join(tmp_dir, "levels.npy")
+        np.save(times_path, level_frame.times)
+        np.save(levels_path, level_frame.levels)
+
+        with ProcessPoolExecutor(
+            max_workers=min(workers, len(cauldron_ids)),
+            initializer=_init_worker,
+            initargs=(times_path, levels_path, level_frame.cauldron_ids),
+        ) as pool:
+            # map() hands results back in submission order as they complete
+            yield from zip(cauldron_ids, pool.map(_reconcile_mapped, jobs))
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
@@ -0,0 +1,62 @@
+"""
+Ramer-Douglas-Peucker polyline simplification in plain NumPy.
+
+Drop-in replacement for `rdp.rdp` (same vertices, same tie-breaking) that
+uses an explicit stack instead of recursion and computes the perpendicular
+distances of each sub-range in one vectorized call. Safe on multi-million
+point histories where the `rdp` package is slow and can hit the recursion
+limit.
+"""
+import numpy as np
+
+
+def _line_distances(points, start, end):
+    """Perpendicular distance of every row of `points` to the line start->end."""
+    d = end - start
+    norm = np.hypot(d[0], d[1])
+    if norm == 0:
+        return np.hypot(points[:, 0] - start[0], points[:, 1] - start[1])
+    return np.abs(d[0] * (start[1] - points[:, 1]) - d[1] * (start[0] - points[:, 0])) / norm
+
+
+def rdp_mask(points, epsilon=0):
+    """
+    Boolean mask of the points kept by RDP simplification.
+
+    points: (N, 2) array of (x, y)
+    epsilon: max perpendicular distance a dropped point may have
+    """
+    points = np.asarray(points, dtype=float)
+    n = len(points)
+    mask = np.zeros(n, dtype=bool)
+    if n == 0:
+        return mask
+    mask[0] = mask[-1] = True
+
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        dists = _line_distances(points[first + 1:last], points[first], points[last])
+        i = int(np.argmax(dists))
+        if dists[i] > epsilon:
+            index = first + 1 + i
+            mask[index] = True
+            stack.append((index, last))
+            stack.append((first, index))
+    return mask
+
+
+def rdp(points, epsilon=0, return_mask=False):
+    """
+    Simplify a polyline.
+
+    Returns the kept vertices as an (M, 2) array, or the boolean mask over
+    the input rows when return_mask=True.
+    """
+    points = np.asarray(points, dtype=float)
+    mask = rdp_mask(points, epsilon)
+    if return_mask:
+        return mask
+    return points[mask]
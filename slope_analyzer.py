@@ -1,52 +1,191 @@
-import requests
-import pandas as pd
 import numpy as np
-from rdp import rdp
-from datetime import date  # <-- 1. ADD THIS IMPORT
+from simplify import rdp
+
+# One row per falling segment of the simplified polygon (see extract_drains)
+DRAIN_DTYPE = np.dtype([
+    ("start_idx", np.int64),     # sample index where the drain starts
+    ("end_idx", np.int64),       # sample index where it ends
+    ("start_time", np.int64),    # epoch seconds
+    ("end_time", np.int64),      # epoch seconds
+    ("start_level", np.float64),
+    ("end_level", np.float64),
+    ("volume", np.float64),      # litres removed, fill during the drain added back
+    ("duration", np.int64),      # seconds
+])
+
+SECONDS_PER_DAY = 86400
+
+
+def to_epoch_seconds(timestamps):
+    """
+    int64 epoch seconds for ints, datetime64 arrays, pandas DatetimeIndex or
+    sequences of Timestamp/datetime (pandas is never imported here).
+    """
+    if hasattr(timestamps, "asi8"):                      # DatetimeIndex / Series.dt
+        unit = getattr(getattr(timestamps, "dtype", None), "unit", "ns")
+        return timestamps.asi8 // {"s": 1, "ms": 10**3, "us": 10**6, "ns": 10**9}[unit]
+    arr = np.asarray(timestamps)
+    if arr.dtype.kind in "iu":
+        return arr.astype(np.int64)
+    if arr.dtype.kind == "M":
+        return arr.astype("datetime64[s]").astype(np.int64)
+    return np.array([int(t.timestamp()) for t in arr], dtype=np.int64)
+
+
+def extract_drains(vertex_idx, vertex_levels, times, fill_rate=0.0, start=None, end=None,
+                   min_volume=0.0, min_duration=0, gaps=None):
+    """
+    Every falling segment of a simplified polygon at once, as a DRAIN_DTYPE
+    structured array ordered by time.
+
+    vertex_idx: sample index of each simplified vertex
+    vertex_levels: level at each vertex
+    times: int64 epoch seconds of the raw samples
+    fill_rate: L/min still flowing in during a drain; volume is the level
+        drop plus fill_rate * duration in minutes
+    start, end: keep drains whose end time is in [start, end) (epoch seconds)
+    min_volume, min_duration: drop smaller drains (litres, seconds)
+    gaps: optional bool per vertex segment; segments bridging a data gap
+        are never drains
+    """
+    idx = np.asarray(vertex_idx, dtype=np.int64)
+    lvl = np.asarray(vertex_levels, dtype=float)
+    times = np.asarray(times, dtype=np.int64)
+
+    is_falling = lvl[1:] < lvl[:-1]
+    if gaps is not None:
+        is_falling &= ~np.asarray(gaps, dtype=bool)
+    falling = np.flatnonzero(is_falling)
+    i0, i1 = idx[falling], idx[falling + 1]
+    t0, t1 = times[i0], times[i1]
+    duration = t1 - t0
+    volume = (lvl[falling] - lvl[falling + 1]) + duration / 60 * fill_rate
+
+    keep = np.ones(len(falling), dtype=bool)
+    if start is not None:
+        keep &= t1 >= start
+    if end is not None:
+        keep &= t1 < end
+    if min_volume:
+        keep &= volume >= min_volume
+    if min_duration:
+        keep &= duration >= min_duration
+
+    drains = np.empty(int(keep.sum()), dtype=DRAIN_DTYPE)
+    drains["start_idx"], drains["end_idx"] = i0[keep], i1[keep]
+    drains["start_time"], drains["end_time"] = t0[keep], t1[keep]
+    drains["start_level"], drains["end_level"] = lvl[falling][keep], lvl[falling + 1][keep]
+    drains["volume"] = volume[keep]
+    drains["duration"] = duration[keep]
+    return drains
+
+
+def split_by_day(drains):
+    """{UTC day number (end_time // 86400): drains ending that day}, as array views."""
+    days = drains["end_time"] // SECONDS_PER_DAY
+    if len(days) == 0:
+        return {}
+    cuts = np.flatnonzero(np.diff(days)) + 1
+    return {int(chunk[0]): drains[lo:hi]
+            for chunk, lo, hi in zip(np.split(days, cuts), np.r_[0, cuts], np.r_[cuts, len(days)])}
+
 
 class SlopeAnalyzer:
-    # ... (all the class code remains unchanged) ...
-    # ... (SlopeAnalyzer.__init__)
-    # ... (SlopeAnalyzer._simplify)
-    # ... (SlopeAnalyzer._compute_slopes)
-    # ... (SlopeAnalyzer.inflection_points)
-    # ... (SlopeAnalyzer.average_positive_slope)
-    # ... (SlopeAnalyzer.average_negative_slope)
-    def __init__(self, timestamps, levels, epsilon=20):
-        self.timestamps = np.array(timestamps)
-        self.levels = np.array(levels, dtype=float)
+    """
+    Piecewise-linear summary of one cauldron's level history.
+
+    The polygon is simplified against sample time (minutes since the first
+    reading), not sample index, so slopes are true L/min on irregular,
+    downsampled or gappy streams and no resample() pass is needed first.
+    Readings are sorted by time; for duplicate timestamps the last one wins.
+
+    max_gap: seconds without readings after which the series is split.
+        Each run is simplified on its own and the segment bridging a gap is
+        neither a slope nor a drain. None (default) draws straight through
+        gaps, as a resampled-and-interpolated series would.
+    """
+    def __init__(self, timestamps, levels, epsilon=20, max_gap=None):
+        times = to_epoch_seconds(timestamps)
+        timestamps = np.asarray(timestamps)
+        levels = np.asarray(levels, dtype=float)
+        step = np.diff(times)
+        if len(step) and step.min() <= 0:
+            order = np.argsort(times, kind="stable")
+            times, timestamps, levels = times[order], timestamps[order], levels[order]
+            last = np.r_[times[1:] != times[:-1], True]
+            times, timestamps, levels = times[last], timestamps[last], levels[last]
+
+        self.times = times
+        self.timestamps = timestamps
+        self.levels = levels
         self.epsilon = epsilon
-        self.simplified = None
+        self.max_gap = max_gap
+        self.vertex_idx = None      # sample index of each simplified vertex
+        self.gaps = None            # per vertex segment: True if it bridges a gap
+        self.simplified = None      # (minutes since first reading, level) per vertex
         self.slopes = None
         self._simplify()
         self._compute_slopes()
 
     def _simplify(self):
-        time_idx = np.arange(len(self.timestamps))
-        points = np.column_stack((time_idx, self.levels))
-        self.simplified = rdp(points, epsilon=self.epsilon)
+        minutes = (self.times - self.times[0]) / 60 if len(self.times) else np.empty(0)
+        points = np.column_stack((minutes, self.levels))
+        run = np.zeros(len(self.times), dtype=np.int64)
+        if self.max_gap is not None and len(self.times) > 1:
+            run[1:] = np.cumsum(np.diff(self.times) > self.max_gap)
+
+        mask = np.zeros(len(points), dtype=bool)
+        bounds = np.flatnonzero(np.diff(run)) + 1
+        for lo, hi in zip(np.r_[0, bounds], np.r_[bounds, len(points)]):
+            mask[lo:hi] = rdp(points[lo:hi], epsilon=self.epsilon, return_mask=True)
+
+        self.vertex_idx = np.flatnonzero(mask)
+        self.gaps = run[self.vertex_idx[1:]] != run[self.vertex_idx[:-1]]
+        self.simplified = points[mask]
 
     def _compute_slopes(self):
-        slopes = []
-        xs = self.simplified[:, 0].astype(int)
+        xs = self.simplified[:, 0]
         ys = self.simplified[:, 1]
-        for i in range(1, len(xs)):
-            dt = xs[i] - xs[i-1]
-            if dt <= 0: continue
-            dy = ys[i] - ys[i-1]
-            slope = dy / dt
-            slopes.append(slope)
-        self.slopes = slopes
+        dt = np.diff(xs)
+        ok = (dt > 0) & ~self.gaps
+        self.slopes = (np.diff(ys)[ok] / dt[ok]).tolist()
 
     def inflection_points(self):
-        xs = self.simplified[:, 0].astype(int)
-        ys = self.simplified[:, 1]
-        points = []
-        for i in range(len(xs)):
-            ts = self.timestamps[xs[i]]
-            lvl = ys[i]
-            points.append((ts, lvl))
-        return points
+        return list(zip(np.asarray(self.timestamps)[self.vertex_idx], self.simplified[:, 1].tolist()))
+
+    def _weighted_rate(self, rising):
+        """Total level change over total duration of the rising (or falling) segments, L/min."""
+        dt = np.diff(self.simplified[:, 0])
+        dy = np.diff(self.simplified[:, 1])
+        ok = (dt > 0) & ~np.asarray(self.gaps, dtype=bool) & ((dy > 0) if rising else (dy < 0))
+        return float(dy[ok].sum() / dt[ok].sum()) if ok.any() else 0.0
+
+    @property
+    def fill_rate(self):
+        """
+        Learned inflow of this cauldron in L/min: the rise over the rising
+        segments divided by their total duration, so a short steep segment
+        weighs no more than the minutes it covers. Inflow keeps running while
+        a courier drains the cauldron, so drains() adds fill_rate * duration
+        back to each level drop.
+        """
+        return self._weighted_rate(rising=True)
+
+    @property
+    def pour_rate(self):
+        """Duration-weighted outflow while draining, L/min (positive)."""
+        return -self._weighted_rate(rising=False)
+
+    def drains(self, fill_rate=None, start=None, end=None, min_volume=0.0, min_duration=0):
+        """
+        Falling segments as a DRAIN_DTYPE array (see extract_drains), with
+        volumes compensated for inflow. fill_rate defaults to the learned
+        self.fill_rate; pass 0 for the raw level drop.
+        """
+        if fill_rate is None:
+            fill_rate = self.fill_rate
+        return extract_drains(self.vertex_idx, self.simplified[:, 1], self.times,
+                              fill_rate, start, end, min_volume, min_duration, gaps=self.gaps)
 
     def average_positive_slope(self):
         pos = [s for s in self.slopes if s > 0]
@@ -57,76 +196,210 @@ class SlopeAnalyzer:
         return sum(neg)/len(neg) if neg else 0
 
 
-def get_negative_intervals_ending_on(inflection_points, target_date, avg_growth_rate):
+class IncrementalSlopeAnalyzer(SlopeAnalyzer):
     """
-    Finds negative slope intervals that end on a specific calendar date.
+    Streaming variant of SlopeAnalyzer for live monitoring.
+
+    New readings are added with append(timestamps, levels), oldest first and
+    newer than anything already appended. Only the unsettled tail (raw
+    points after the last finalized inflection point) is re-simplified;
+    everything before it is frozen, so each append costs O(tail + new
+    points) instead of O(history).
+
+    settle_vertices: how many trailing RDP vertices stay provisional. The last
+    vertex is always the newest reading and the one before it can still move
+    when more data arrives, so 2 is the smallest safe value.
+    max_gap: as for SlopeAnalyzer; a gap freezes the whole tail and the
+    readings after it start a new run.
     """
-    found_intervals = []
-    
-    if len(inflection_points) < 2:
-        return found_intervals
+    def __init__(self, timestamps=(), levels=(), epsilon=20, settle_vertices=2, max_gap=None):
+        self.epsilon = epsilon
+        self.settle_vertices = max(2, settle_vertices)
+        self.max_gap = max_gap
+
+        self.timestamps = []
+        self._times = []
+        self._n = 0                                  # total readings seen
+        self._tail_start = 0                         # global index of the tail anchor
+        self._tail_points = np.empty((0, 2))         # (minutes, level) from the anchor on
+        self._final = []                             # frozen (minutes, level) vertices, anchor last
+        self._final_idx = []
+        self._final_gaps = []
+        self._final_slopes = []
+        self._anchor_frozen = False                  # tail anchor already in _final
+        self._tail = np.empty((0, 2))                # provisional vertices, anchor excluded
+        self._tail_idx = np.empty(0, dtype=np.int64)
+        self._tail_slopes = []
+
+        self.append(timestamps, levels)
+
+    @property
+    def simplified(self):
+        final = np.array(self._final, dtype=float).reshape(-1, 2)
+        return np.vstack((final, self._tail))
+
+    @property
+    def vertex_idx(self):
+        return np.r_[np.asarray(self._final_idx, dtype=np.int64), self._tail_idx]
 
-    for i in range(len(inflection_points) - 1):
+    @property
+    def gaps(self):
+        return np.r_[np.asarray(self._final_gaps, dtype=bool), np.zeros(len(self._tail_idx), dtype=bool)]
+
+    @property
+    def slopes(self):
+        return self._final_slopes + self._tail_slopes
+
+    @property
+    def times(self):
+        return np.asarray(self._times, dtype=np.int64)
+
+    def append(self, timestamps, levels):
+        """Add new readings (oldest first) and update the simplified polygon."""
+        levels = np.asarray(levels, dtype=float)
+        if levels.size == 0:
+            return
+        timestamps = list(timestamps)
+        times = to_epoch_seconds(timestamps)
+        if not self._times:
+            self._origin = int(times[0])
+
+        # Split at gaps (including the one since the previous append)
+        cuts = []
+        if self.max_gap is not None:
+            prev = np.r_[self._times[-1] if self._times else times[0], times[:-1]]
+            cuts = np.flatnonzero(times - prev > self.max_gap).tolist()
+        for lo, hi in zip([0] + cuts, cuts + [len(times)]):
+            if lo in cuts:
+                self._freeze_tail()
+            if hi > lo:
+                self._extend(timestamps[lo:hi], times[lo:hi], levels[lo:hi])
+
+    def _extend(self, timestamps, times, levels):
+        self.timestamps.extend(timestamps)
+        self._times.extend(times.tolist())
+        points = np.column_stack(((times - self._origin) / 60, levels))
+        self._tail_points = np.vstack((self._tail_points, points))
+        self._n += len(levels)
+        self._simplify()
+        self._compute_slopes()
+
+    def _freeze_tail(self):
+        """Freeze every provisional vertex and start a new run after a gap."""
+        if not self._anchor_frozen:
+            return
+        self._final.extend((x, y) for x, y in self._tail)
+        self._final_idx.extend(self._tail_idx.tolist())
+        self._final_gaps.extend([False] * len(self._tail_idx))
+        self._final_slopes.extend(self._tail_slopes)
+        self._tail = np.empty((0, 2))
+        self._tail_idx = np.empty(0, dtype=np.int64)
+        self._tail_slopes = []
+        self._tail_points = np.empty((0, 2))
+        self._tail_start = self._n
+        self._anchor_frozen = False
+
+    def _simplify(self):
+        """Re-run RDP on the tail only and freeze vertices that have settled"""
+        mask = rdp(self._tail_points, epsilon=self.epsilon, return_mask=True)
+        tail = self._tail_points[mask]
+        tail_idx = self._tail_start + np.flatnonzero(mask)
+
+        if not self._anchor_frozen:
+            if self._final:
+                self._final_gaps.append(True)        # segment from the previous run
+            self._final.append((tail[0, 0], tail[0, 1]))
+            self._final_idx.append(int(tail_idx[0]))
+            self._anchor_frozen = True
+
+        # tail[0] is the current anchor (already frozen); tail[1:n_freeze+1] settle now
+        n_freeze = len(tail) - self.settle_vertices
+        if n_freeze > 0:
+            frozen = tail[1:n_freeze + 1]
+            prev = self._final[-1]
+            for x, y in frozen:
+                dt = x - prev[0]
+                if dt > 0:
+                    self._final_slopes.append((y - prev[1]) / dt)
+                prev = (x, y)
+            self._final.extend((x, y) for x, y in frozen)
+            self._final_idx.extend(tail_idx[1:n_freeze + 1].tolist())
+            self._final_gaps.extend([False] * n_freeze)
+
+            anchor = int(tail_idx[n_freeze])
+            self._tail_points = self._tail_points[anchor - self._tail_start:]
+            self._tail_start = anchor
+            tail, tail_idx = tail[n_freeze:], tail_idx[n_freeze:]
+
+        self._tail = tail[1:]
+        self._tail_idx = tail_idx[1:]
+
+    def _compute_slopes(self):
+        """Slopes of the provisional tail segments (frozen ones are cached)"""
+        slopes = []
+        px, py = self._final[-1]
+        for x, y in self._tail:
+            dt = x - px
+            if dt > 0:
+                slopes.append((y - py) / dt)
+            px, py = x, y
+        self._tail_slopes = slopes
+
+
+def learn_rates(frame, epsilon=20, cauldron_ids=None, max_gap=None):
+    """
+    Per-cauldron {"fill_rate", "pour_rate"} (L/min) learned from a
+    LevelFrame, in the shape of "AI Model/slopes.json".
+    """
+    rates = {}
+    for cid in cauldron_ids or frame.cauldron_ids:
+        times, levels = frame.series(cid)
+        if len(times) < 2:
+            continue
+        an = SlopeAnalyzer(times, levels, epsilon=epsilon, max_gap=max_gap)
+        rates[cid] = {"fill_rate": round(an.fill_rate, 5), "pour_rate": round(an.pour_rate, 5)}
+    return rates
+
+
+def index_negative_intervals_by_date(inflection_points, avg_growth_rate):
+    """
+    Buckets every negative slope interval by the calendar date it ends on.
+    Returns {date: [interval, ...]}, so answering one day is a dict lookup
+    instead of another pass over the whole history.
+
+    Works on (Timestamp, level) pairs; SlopeAnalyzer.drains() is the
+    array-based equivalent for new code.
+    """
+    intervals_by_date = {}
+
+    # Only the falling segments need Timestamp arithmetic; find them in one pass
+    values = np.array([value for _, value in inflection_points], dtype=float)
+    for i in np.flatnonzero(values[1:] < values[:-1]).tolist():
         start_time, start_value = inflection_points[i]
         end_time, end_value = inflection_points[i+1]
-        
-        is_negative_slope = end_value < start_value
-        matches_target_date = end_time.date() == target_date
-        
-        if is_negative_slope and matches_target_date:
-            time_taken = end_time - start_time
-            drain_volume = (start_value - end_value) + time_taken.total_seconds() / 60 * avg_growth_rate
-            
-            found_intervals.append({
-                "interval": (start_time, end_time),
-                "end_point": (end_time, end_value),
-                "duration": time_taken,
-                "drain_volume": drain_volume
-            })
-            
-    return found_intervals
-
-
-# <-- 2. ADD THIS WRAPPER -->
+
+        time_taken = end_time - start_time
+        drain_volume = (start_value - end_value) + time_taken.total_seconds() / 60 * avg_growth_rate
+
+        intervals_by_date.setdefault(end_time.date(), []).append({
+            "interval": (start_time, end_time),
+            "end_point": (end_time, end_value),
+            "duration": time_taken,
+            "drain_volume": drain_volume
+        })
+
+    return intervals_by_date
+
+
+def get_negative_intervals_ending_on(inflection_points, target_date, avg_growth_rate):
+    """
+    Finds negative slope intervals that end on a specific calendar date.
+    """
+    return index_negative_intervals_by_date(inflection_points, avg_growth_rate).get(target_date, [])
+
+
+# The command-line report lives in slope_analyzer_cli.py so that importing
+# this module never pulls in pandas/requests or touches the network.
 if __name__ == "__main__":
-    
-    # This code will ONLY run when you execute this file directly
-    # It will NOT run when you import it from another file
-    
-    BASE_URL = "https://hackutd2025.eog.systems"
-
-    # Fetch full data
-    data = requests.get(f"{BASE_URL}/api/Data?start_date=0&end_date=1762645088").json()
-
-    # Load into DataFrame
-    rows = []
-    for entry in data:
-        timestamp = entry["timestamp"]
-        for cid, level in entry["cauldron_levels"].items():
-            rows.append([timestamp, cid, level])
-
-    df = pd.DataFrame(rows, columns=["timestamp", "cauldron_id", "level"])
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
-    df = df.sort_values(by="timestamp")
-
-    # Only Cauldron 001
-    df_1 = df[df["cauldron_id"] == "cauldron_001"].sort_values(by="timestamp")
-
-    an = SlopeAnalyzer(df_1["timestamp"], df_1["level"], epsilon=20)
-
-    print(f"Average positive slope: {an.average_positive_slope():.3f} L/min")
-    print(f"Average negative slope: {an.average_negative_slope():.3f} L/min")
-
-    # --- You need to define the target_date here for this part to work ---
-    #     (Using an example date from your ticket data)
-    target_date = date(2025, 10, 30) 
-    
-    print(f"\n===== Drain Info with Volumes for {target_date} =====")
-    drain_infos = get_negative_intervals_ending_on(an.inflection_points(), target_date, an.average_positive_slope())
-    
-    if not drain_infos:
-        print("No drain events found for this date.")
-    else:
-        for info in drain_infos:
-            volume = info["drain_volume"]
-            print(f"  - Drain Volume: {volume:.2f} L, Duration: {info['duration']}")
\ No newline at end of file
+    from slope_analyzer_cli import main
+    main()
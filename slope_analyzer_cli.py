@@ -0,0 +1,70 @@
+"""
+Command-line slope report for one cauldron.
+
+Usage:
+    python slope_analyzer_cli.py                                  # cauldron_001, 2025-10-30
+    python slope_analyzer_cli.py --cauldron cauldron_004 --date 2025-11-02
+    python slope_analyzer_cli.py --no-cache                       # bypass .level_cache
+    python slope_analyzer_cli.py --write-rates "AI Model/slopes.json"  # learned rates, all cauldrons
+"""
+import argparse
+import json
+from datetime import date, datetime, timedelta, timezone
+
+from data_loader import BASE_URL, fetch_levels
+from level_cache import load_levels
+from slope_analyzer import SlopeAnalyzer, learn_rates
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Print slope and drain info for one cauldron.")
+    parser.add_argument("--cauldron", default="cauldron_001")
+    parser.add_argument("--date", default="2025-10-30", help="drain end date, YYYY-MM-DD")
+    parser.add_argument("--epsilon", type=float, default=20, help="RDP simplification tolerance")
+    parser.add_argument("--min-volume", type=float, default=0.0, help="hide drains smaller than this (L)")
+    parser.add_argument("--min-duration", type=int, default=0, help="hide drains shorter than this (s)")
+    parser.add_argument("--max-gap", type=int, default=None,
+                        help="split the series where readings are more than this many seconds apart")
+    parser.add_argument("--no-cache", action="store_true", help="skip the local level cache")
+    parser.add_argument("--write-rates", metavar="PATH",
+                        help="write learned fill/pour rates of every cauldron to PATH and exit")
+    args = parser.parse_args()
+
+    # Full history in the wide columnar layout (synced into the local cache)
+    if args.no_cache:
+        levels = fetch_levels(start_date=0, end_date=1762645088, base_url=BASE_URL)
+    else:
+        levels = load_levels(start_date=0, end_date=1762645088, base_url=BASE_URL)
+
+    if args.write_rates:
+        rates = learn_rates(levels, epsilon=args.epsilon, max_gap=args.max_gap)
+        with open(args.write_rates, "w") as f:
+            json.dump(rates, f, indent=4)
+        print(f"Wrote fill/pour rates for {len(rates)} cauldron(s) to {args.write_rates}")
+        return
+
+    times, values = levels.series(args.cauldron)
+    an = SlopeAnalyzer(times, values, epsilon=args.epsilon, max_gap=args.max_gap)
+
+    print(f"===== {args.cauldron} Slope Summary =====")
+    print(f"Average positive slope: {an.average_positive_slope():.3f} L/min")
+    print(f"Average negative slope: {an.average_negative_slope():.3f} L/min")
+    print(f"Learned fill rate: {an.fill_rate:.3f} L/min (added back to drain volumes)")
+
+    target_date = date.fromisoformat(args.date)
+
+    print(f"\n===== Drain Info with Volumes for {target_date} =====")
+    day_start = int(datetime.combine(target_date, datetime.min.time(), timezone.utc).timestamp())
+    drains = an.drains(start=day_start, end=day_start + 86400,
+                       min_volume=args.min_volume, min_duration=args.min_duration)
+
+    if len(drains) == 0:
+        print("No drain events found for this date.")
+    else:
+        for drain in drains:
+            duration = timedelta(seconds=int(drain["duration"]))
+            print(f"  - Drain Volume: {drain['volume']:.2f} L, Duration: {duration}")
+
+
+if __name__ == "__main__":
+    main()
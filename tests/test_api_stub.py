@@ -0,0 +1,123 @@
+import pytest
+import requests
+
+from api_client import (CAULDRONS_PATH, DATA_PATH, MARKET_PATH, NETWORK_PATH, TICKETS_PATH,
+                        ApiClient, TopologyCache)
+from api_stub import DRAIN_VOLUME, SAMPLE_START, StubApiServer, sample_payloads
+from data_loader import fetch_levels
+from reconcile import reconcile_cauldron
+from ticket_matcher import TicketIndex
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def server():
+    with StubApiServer() as server:
+        yield server
+
+
+@pytest.fixture
+def api(server):
+    with ApiClient(server.url, backoff=0.001) as api:
+        yield api
+
+
+def test_retries_transient_errors(server, api):
+    server.fail(MARKET_PATH, times=2, status=503)
+    assert api.market()["id"] == "market_001"
+    assert len(server.requests) == 3
+    stats = api.metrics.endpoints[MARKET_PATH]
+    assert (stats.calls, stats.retries, stats.failures) == (1, 2, 0)
+
+
+def test_gives_up_after_max_retries(server, api):
+    server.fail(MARKET_PATH, times=10, status=502)
+    with pytest.raises(requests.HTTPError):
+        api.market()
+    assert len(server.requests) == api.retries + 1
+    assert api.metrics.endpoints[MARKET_PATH].failures == 1
+
+
+def test_client_errors_are_not_retried(server, api):
+    server.fail(TICKETS_PATH, times=1, status=404)
+    with pytest.raises(requests.HTTPError):
+        api.tickets()
+    assert len(server.requests) == 1
+
+
+def test_backoff_grows_and_honours_retry_after(api):
+    class Response:
+        status_code = 503
+        headers = {}
+
+    delays = [api._retry_delay(attempt, Response()) for attempt in range(api.retries + 1)]
+    assert delays[-1] is None
+    for attempt, delay in enumerate(delays[:-1]):
+        assert api.backoff * 2 ** attempt * 0.5 <= delay <= api.backoff * 2 ** attempt
+
+    Response.headers = {"Retry-After": "2"}
+    assert api._retry_delay(0, Response()) == 2.0
+
+
+def test_topology_cache_ttl_and_etag(server, api):
+    clock = FakeClock()
+    cache = TopologyCache(ttl=60, clock=clock)
+
+    first = api.get_cached(NETWORK_PATH, cache)
+    assert first.changed and first.etag
+    assert api.get_cached(NETWORK_PATH, cache) is first      # inside the TTL: no request
+    assert len(server.requests) == 1
+
+    clock.now = 61
+    entry = api.get_cached(NETWORK_PATH, cache)              # conditional request -> 304
+    assert not entry.changed and cache.not_modified == 1
+    assert len(server.requests) == 2
+
+    server.payloads[NETWORK_PATH] = {"edges": [], "description": "changed"}
+    clock.now = 122
+    entry = api.get_cached(NETWORK_PATH, cache)
+    assert entry.changed and entry.value["description"] == "changed"
+
+
+def test_topology_cache_without_etags_detects_identical_payloads():
+    with StubApiServer(etags=False) as server, ApiClient(server.url) as api:
+        clock = FakeClock()
+        cache = TopologyCache(ttl=0, clock=clock)
+        assert api.get_cached(CAULDRONS_PATH, cache).changed
+        assert not api.get_cached(CAULDRONS_PATH, cache).changed
+        assert (cache.requests, cache.not_modified, cache.unchanged) == (2, 0, 1)
+
+
+def test_fetch_levels(server, api):
+    frame = fetch_levels(SAMPLE_START, SAMPLE_START + 59 * 60, client=api)
+    assert len(frame) == 60
+    assert frame.cauldron_ids == ["cauldron_001", "cauldron_002", "cauldron_003"]
+    assert frame.times[0] == SAMPLE_START and (frame.times[1:] - frame.times[:-1] == 60).all()
+    assert frame.column("cauldron_002")[10] == pytest.approx(200 + 10 + 0.5 * 10)
+    assert server.requests[0][0] == DATA_PATH
+
+
+def test_stub_drains_match_their_tickets(api):
+    frame = fetch_levels(client=api)
+    tickets = api.tickets()["transport_tickets"]
+    index = TicketIndex(tickets)
+    day = tickets[0]["date"]
+
+    for cid in frame.cauldron_ids:
+        result = reconcile_cauldron(cid, frame.times, frame.column(cid), {day: index.tickets_for(cid, day)},
+                                    [day], tolerance=5, time_budget=2.0)
+        matches = result[day]["matches"]
+        assert [m["type"] for m in matches] == ["1-to-1"]
+        assert matches[0]["drain_volume"] == pytest.approx(DRAIN_VOLUME, abs=5)
+        assert result[day]["anomalies"] == []
+
+
+def test_sample_payloads_are_deterministic():
+    assert sample_payloads() == sample_payloads()
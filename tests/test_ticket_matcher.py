@@ -0,0 +1,51 @@
+from ticket_matcher import TicketIndex, assign_one_to_one, match_drains_to_tickets, subset_sum
+
+
+def drains(*volumes):
+    return [{"drain_volume": v} for v in volumes]
+
+
+def tickets(*volumes):
+    return [{"ticket_id": f"T{i}", "amount_collected": v} for i, v in enumerate(volumes)]
+
+
+def test_one_to_one_maximizes_matches():
+    assert assign_one_to_one([100, 104], [98, 101], 3) == {0: 0, 1: 1}
+    result = match_drains_to_tickets(drains(100, 104), tickets(98, 101), 3)
+    assert len(result.matches) == 2 and not result.unmatched_tickets
+
+
+def test_one_to_one_prefers_smallest_total_difference():
+    assert assign_one_to_one([50, 60], [48.5, 50.5, 60.5], 2) == {0: 1, 1: 2}
+    assert assign_one_to_one([10, 11], [10, 11], 1) == {0: 0, 1: 1}
+
+
+def test_many_to_one_uses_fewest_tickets():
+    result = match_drains_to_tickets(drains(90), tickets(30, 30, 30, 45, 45), 1)
+    (event, picked, approximate), = result.matches
+    assert sorted(t["amount_collected"] for t in picked) == [45, 45]
+    assert not approximate
+    assert len(result.unmatched_tickets) == 3
+
+
+def test_subset_sum_no_fit():
+    assert subset_sum([10, 20], 100, 1) == (None, False)
+
+
+def test_unmatched_drains_and_tickets():
+    result = match_drains_to_tickets(drains(500), tickets(10), 5)
+    assert result.matches == []
+    assert result.unmatched_drains == drains(500)
+    assert [t["ticket_id"] for t in result.unmatched_tickets] == ["T0"]
+
+
+def test_ticket_index():
+    index = TicketIndex([
+        {"ticket_id": "a", "cauldron_id": "c1", "date": "2025-10-30", "amount_collected": 20},
+        {"ticket_id": "b", "cauldron_id": "c1", "date": "2025-10-30", "amount_collected": 10},
+        {"ticket_id": "c", "cauldron_id": "c2", "date": "2025-10-30", "amount_collected": 5},
+    ])
+    assert [t["ticket_id"] for t in index.tickets_for("c1", "2025-10-30")] == ["b", "a"]
+    assert index.tickets_for("c1", "2025-10-31") == []
+    index.mark_matched(["a"])
+    assert index.matched_ids == {"a"} and index.unmatched_ids == {"b", "c"} and len(index) == 3
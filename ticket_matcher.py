@@ -0,0 +1,241 @@
+"""
+Drain-to-ticket matching engine used by find_matches.py.
+
+A drain matches a set of tickets when |drain_volume - sum(tickets)| is within
+the volume tolerance (the same VOLUME_TOLERANCE rule as before).
+
+    Phase 1: as many 1-to-1 matches as possible, with the smallest total
+             volume difference (shortest augmenting paths over the graph
+             of drain/ticket pairs within tolerance).
+    Phase 2: remaining drains (largest first) are matched to the fewest
+             tickets whose sum fits, using a subset-sum DP over volumes
+             discretized to VOLUME_RESOLUTION instead of trying every
+             itertools.combinations() of every size.
+
+The DP costs O(n_tickets * drain_volume / resolution) per drain, which is
+bounded by MAX_DP_CELLS (the grid is coarsened past that), and the whole
+call is bounded by a wall-clock time budget.
+"""
+import math
+import time
+from bisect import bisect_left, bisect_right
+
+import numpy as np
+
+VOLUME_RESOLUTION = 0.01     # ticket volumes are reported to 2 decimals, so sums stay exact
+MAX_DP_CELLS = 4_000_000     # tickets x volume bins before the grid gets coarsened
+DEFAULT_TIME_BUDGET = 2.0    # seconds per cauldron/day
+
+_UNREACHABLE = 1 << 30                 # "no subset reaches this sum"; +1 must not overflow int32
+
+
+class MatchResult:
+    def __init__(self):
+        self.matches = []              # (drain_event, [tickets], approximate)
+        self.unmatched_drains = []
+        self.unmatched_tickets = []
+        self.budget_exhausted = False  # True if Phase 2 stopped early on the time budget
+
+    @property
+    def approximate_matches(self):
+        """Matches found on a discretized grid whose exact sum misses the tolerance."""
+        return [m for m in self.matches if m[2]]
+
+
+class TicketIndex:
+    """
+    Tickets grouped once by (cauldron_id, date) and sorted by volume, with
+    matched/unmatched state tracked by ticket_id. Replaces scanning the full
+    ticket list for every cauldron on every date.
+    """
+    def __init__(self, tickets):
+        self._by_key = {}
+        for ticket in tickets:
+            self._by_key.setdefault((ticket["cauldron_id"], ticket["date"]), []).append(ticket)
+        for group in self._by_key.values():
+            group.sort(key=lambda t: t["amount_collected"])
+
+        self.unmatched_ids = {t["ticket_id"] for t in tickets}
+        self.matched_ids = set()
+
+    def __len__(self):
+        return len(self.unmatched_ids) + len(self.matched_ids)
+
+    def tickets_for(self, cauldron_id, date_str):
+        """All tickets for one cauldron/day, smallest volume first."""
+        return self._by_key.get((cauldron_id, date_str), [])
+
+    def mark_matched(self, ticket_ids):
+        for ticket_id in ticket_ids:
+            self.unmatched_ids.discard(ticket_id)
+            self.matched_ids.add(ticket_id)
+
+
+def subset_sum(volumes, target, tolerance, resolution=VOLUME_RESOLUTION,
+               max_cells=MAX_DP_CELLS, deadline=None):
+    """
+    Fewest items of `volumes` whose sum is within `tolerance` of `target`
+    (ties go to the sum closest to target).
+
+    Returns (indices, approximate), or (None, False) when no subset fits.
+    `approximate` is True when the subset only fits on the discretized grid,
+    which can happen when volumes are not multiples of `resolution` or the
+    grid had to be coarsened to stay under `max_cells`.
+    Raises TimeoutError if `deadline` (time.perf_counter() value) passes.
+    """
+    volumes = np.asarray(volumes, dtype=float)
+    if len(volumes) == 0 or target + tolerance < 0:
+        return None, False
+
+    n = len(volumes)
+    top = target + tolerance
+    coarsened = False
+    if n * (top / resolution + 1) > max_cells:
+        resolution *= math.ceil(n * (top / resolution + 1) / max_cells)
+        coarsened = True
+
+    weights = np.rint(volumes / resolution).astype(np.int64)
+    inexact = coarsened or not np.allclose(weights * resolution, volumes, rtol=0, atol=1e-9)
+    hi = int(math.floor(top / resolution + 1e-9))
+    lo = max(0, int(math.ceil((target - tolerance) / resolution - 1e-9)))
+
+    size = hi + 1
+    dp = np.full(size, _UNREACHABLE, dtype=np.int32)   # min items to reach each sum
+    dp[0] = 0
+    took = np.zeros((n, size), dtype=bool)
+
+    for i, w in enumerate(weights):
+        if deadline is not None and time.perf_counter() > deadline:
+            raise TimeoutError("ticket matching time budget exhausted")
+        if w <= 0 or w > hi:
+            continue
+        cand = dp[:size - w] + 1
+        better = cand < dp[w:]
+        took[i, w:] = better
+        dp[w:][better] = cand[better]
+
+    window = dp[lo:hi + 1]
+    reachable = np.flatnonzero(window < _UNREACHABLE)
+    reachable = reachable[window[reachable] > 0]
+    if len(reachable) == 0:
+        return None, False
+
+    sums = (reachable + lo) * resolution
+    best = np.lexsort((np.abs(sums - target), window[reachable]))[0]
+    s = int(reachable[best]) + lo
+
+    picked = []
+    for i in range(n - 1, -1, -1):
+        if took[i, s]:
+            picked.append(i)
+            s -= weights[i]
+    picked.reverse()
+
+    exact_ok = abs(volumes[picked].sum() - target) <= tolerance
+    return picked, inexact and not exact_ok
+
+
+def assign_one_to_one(drain_volumes, ticket_volumes, tolerance):
+    """
+    Maximum-cardinality, minimum-cost 1-to-1 assignment of drains to
+    tickets, where a pair is allowed when the volumes differ by at most
+    `tolerance` and costs that difference. ticket_volumes must be sorted.
+
+    Successive shortest augmenting paths: each round adds one match along
+    the cheapest path (Bellman-Ford from every free drain), so the result
+    is the cheapest assignment of its size and no match count is lost to
+    an early greedy choice. Returns {drain index: ticket index}.
+    """
+    edges = []                         # per drain: [(ticket index, cost)]
+    cost = {}
+    for di, v in enumerate(drain_volumes):
+        lo, hi = bisect_left(ticket_volumes, v - tolerance), bisect_right(ticket_volumes, v + tolerance)
+        edges.append([(ti, round(abs(v - ticket_volumes[ti]), 6)) for ti in range(lo, hi)])
+        cost.update(((di, ti), c) for ti, c in edges[di])
+
+    ticket_of = {}                     # drain index -> ticket index
+    drain_of = {}                      # ticket index -> drain index
+    while True:
+        dist = [math.inf if di in ticket_of else 0.0 for di in range(len(drain_volumes))]
+        tdist = [math.inf] * len(ticket_volumes)
+        via = {}                       # ticket index -> drain it is reached from
+        changed = True
+        while changed:
+            changed = False
+            for di, d in enumerate(dist):
+                if d == math.inf:
+                    continue
+                for ti, c in edges[di]:
+                    if ticket_of.get(di) != ti and d + c < tdist[ti] - 1e-9:
+                        tdist[ti], via[ti] = d + c, di
+                        changed = True
+            for ti, di in drain_of.items():
+                if tdist[ti] - cost[di, ti] < dist[di] - 1e-9:
+                    dist[di] = tdist[ti] - cost[di, ti]
+                    changed = True
+
+        free = [ti for ti, d in enumerate(tdist) if d < math.inf and ti not in drain_of]
+        if not free:
+            return ticket_of
+        ti = min(free, key=lambda t: (tdist[t], t))
+        while True:                    # flip the path back to its free drain
+            di = via[ti]
+            prev = ticket_of.get(di)
+            ticket_of[di], drain_of[ti] = ti, di
+            if prev is None:
+                break
+            ti = prev
+
+
+def match_drains_to_tickets(drain_events, tickets, tolerance, time_budget=DEFAULT_TIME_BUDGET,
+                            resolution=VOLUME_RESOLUTION):
+    """
+    drain_events: dicts with a "drain_volume" key (from slope_analyzer)
+    tickets: dicts with an "amount_collected" key (from /api/Tickets)
+    tolerance: VOLUME_TOLERANCE in liters
+    time_budget: seconds allowed for Phase 2; drains not reached stay unmatched
+    """
+    result = MatchResult()
+    deadline = time.perf_counter() + time_budget
+
+    # Tickets sorted by volume so each drain's 1-to-1 candidates are a bisect range
+    tickets = sorted(tickets, key=lambda t: t["amount_collected"])
+    volumes = [t["amount_collected"] for t in tickets]
+
+    # --- PHASE 1: most 1-to-1 matches, smallest total volume difference ---
+    assigned = assign_one_to_one([e["drain_volume"] for e in drain_events], volumes, tolerance)
+    used_tickets = set(assigned.values())
+    for di in sorted(assigned):
+        result.matches.append((drain_events[di], [tickets[assigned[di]]], False))
+
+    remaining_drains = [e for di, e in enumerate(drain_events) if di not in assigned]
+    remaining_tickets = [t for ti, t in enumerate(tickets) if ti not in used_tickets]
+
+    # --- PHASE 2: many-to-one via bounded subset-sum, largest drains first ---
+    for event in sorted(remaining_drains, key=lambda x: x["drain_volume"], reverse=True):
+        if not remaining_tickets or result.budget_exhausted:
+            result.unmatched_drains.append(event)
+            continue
+        try:
+            picked, approximate = subset_sum(
+                [t["amount_collected"] for t in remaining_tickets],
+                event["drain_volume"],
+                tolerance,
+                resolution=resolution,
+                deadline=deadline,
+            )
+        except TimeoutError:
+            result.budget_exhausted = True
+            result.unmatched_drains.append(event)
+            continue
+
+        if picked is None:
+            result.unmatched_drains.append(event)
+            continue
+
+        picked_set = set(picked)
+        result.matches.append((event, [remaining_tickets[i] for i in picked], approximate))
+        remaining_tickets = [t for i, t in enumerate(remaining_tickets) if i not in picked_set]
+
+    result.unmatched_tickets = remaining_tickets
+    return result
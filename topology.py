@@ -0,0 +1,88 @@
+"""
+In-process model of the delivery network, built straight from the
+/api/Information payloads (cauldrons, market, couriers, network).
+
+geo_points_middleware used to read node coordinates back out of
+Elasticsearch with match_all searches before it could draw edges; the
+coordinates are already in the API responses, so the lookup and the edge
+linestrings are built here instead. Edge docs get deterministic ids
+("from->to"), and diff_edges() compares two snapshots so only added,
+changed or removed edges are written.
+"""
+
+
+def edge_id(from_id, to_id):
+    return f"{from_id}->{to_id}"
+
+
+class Topology:
+    def __init__(self, nodes, edges):
+        """
+        nodes: {node_id: {"lat", "lon", "type", "name"}} for nodes with coordinates
+        edges: [{"from", "to", "travel_time_minutes"}, ...] as sent by /network
+        """
+        self.nodes = nodes
+        self.edges = edges
+
+    @classmethod
+    def from_api(cls, cauldrons, market, couriers=(), network=None):
+        nodes = {}
+
+        def add(node_id, item, node_type, default_name):
+            if node_id is not None and "latitude" in item and "longitude" in item:
+                nodes[node_id] = {
+                    "lat": item["latitude"],
+                    "lon": item["longitude"],
+                    "type": node_type,
+                    "name": item.get("name", default_name),
+                }
+
+        for c in cauldrons:
+            add(c.get("id"), c, "cauldron", c.get("id", "cauldron"))
+        if market:
+            add(market.get("id"), market, "market", "market")
+        for courier in couriers:
+            add(courier.get("courier_id"), courier, "courier", courier.get("courier_id", "courier"))
+
+        edges = (network or {}).get("edges", [])
+        return cls(nodes, edges)
+
+    def geo(self, node_id):
+        """{"lat", "lon"} of a node, or None if it has no coordinates."""
+        node = self.nodes.get(node_id)
+        return {"lat": node["lat"], "lon": node["lon"]} if node else None
+
+    def edge_docs(self):
+        """{edge_id: doc} for every edge whose two endpoints have coordinates."""
+        docs = {}
+        for edge in self.edges:
+            from_id, to_id = edge.get("from"), edge.get("to")
+            from_geo, to_geo = self.geo(from_id), self.geo(to_id)
+            if from_geo and to_geo:
+                docs[edge_id(from_id, to_id)] = {
+                    "from": from_id,
+                    "to": to_id,
+                    "travel_time_minutes": edge.get("travel_time_minutes"),
+                    "line": {
+                        "type": "linestring",
+                        "coordinates": [
+                            [from_geo["lon"], from_geo["lat"]],
+                            [to_geo["lon"], to_geo["lat"]]
+                        ]
+                    }
+                }
+        return docs
+
+    def diff_edges(self, previous=None):
+        """
+        (upserts, deletes) needed to go from `previous` to this topology:
+        upserts is {edge_id: doc} for new or changed edges, deletes the ids of
+        edges that disappeared. With no previous snapshot every edge is new.
+        """
+        docs = self.edge_docs()
+        if previous is None:
+            return docs, []
+        old = previous.edge_docs()
+        upserts = {eid: doc for eid, doc in docs.items() if old.get(eid) != doc}
+        deletes = [eid for eid in old if eid not in docs]
+        return upserts, deletes